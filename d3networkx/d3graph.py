@@ -1,4 +1,4 @@
-from typing import Any, Hashable, Iterable, Protocol, Union
+from typing import Any, Hashable, Iterable, Optional, Protocol, Union
 
 from networkx import DiGraph, Graph
 from networkx.exception import NetworkXError
@@ -25,132 +25,54 @@ class D3Listener(Protocol):
     def edge_removed(self, eidx: int, uidx: int, vidx: int):
         ...
 
+    # Listeners can also define bulk versions, called once per `add_nodes_from`,
+    # `add_edges_from`, `remove_nodes_from` or `remove_edges_from` with a list per
+    # argument:
+    #   nodes_added(nidxs, nodes, data), edges_added(eidxs, uidxs, vidxs, data),
+    #   nodes_removed(nidxs, nodes), edges_removed(eidxs, uidxs, vidxs)
+    # Listeners without them get one single-element call per node or edge instead.
+    # They aren't part of the protocol, so subclasses don't inherit no-op versions.
 
-class D3Graph(Graph):
-    listeners: list[D3Listener] = []
-    n_index = 0
-    e_index = 0
-    node_lookup = []
 
-    def __init__(self, incoming_graph_data=None, **attr):
-        super().__init__(incoming_graph_data, **attr)
-        self.listeners = []
-        self.n_index = 0
-        self.e_index = 0
-        self.node_lookup = []
-        for u in self.nodes():
-            self.nodes[u][NODE_INDEX] = self.n_index
-            self.node_lookup.append(u)
-            self.n_index += 1
-        for u, v in self.edges:
-            self.edges[u, v][EDGE_INDEX] = self.e_index
-            self.e_index += 1
-
-    def add_listener(self, L: D3Listener):
-        if L not in self.listeners:
-            self.listeners.append(L)
-
-    def remove_listener(self, L: D3Listener):
-        if L in self.listeners:
-            self.listeners.remove(L)
-
-    def node_by_index(self, nidx: int) -> Node:
-        return self.node_lookup[nidx]
-
-    def node_index(self, n: Node) -> int:
-        return self.nodes[n][NODE_INDEX]
+def _without_index(data: dict, key: str) -> dict:
+    """Attributes without an index, so copying attributes can't overwrite one"""
+    if key in data:
+        data = data.copy()
+        del data[key]
+    return data
 
-    def edge_index(self, u: Node, v: Node) -> int:
-        return self.edges[u, v][EDGE_INDEX]
 
-    def edge_indices(self, u: Node, v: Node):
-        return self.edge_index(u, v), self.node_index(u), self.node_index(v)
+class _D3GraphMixin:
+    """Node and edge indices, and listener callbacks, for `D3Graph` and `D3DiGraph`.
 
-    def add_node(self, node_for_adding: Node, **attr):
-        # call super, adding in the index value
-        attr[NODE_INDEX] = self.n_index
-        super().add_node(node_for_adding, **attr)
-        self.node_lookup.append(node_for_adding)
+    Nodes and edges get increasing indices as they are added, which are never reused.
+    Bulk methods use networkx's own bulk insertion and notify each listener once.
+    """
 
-        for L in self.listeners:
-            L.node_added(self.n_index, node_for_adding, attr)
-        self.n_index += 1
+    listeners: list[D3Listener]
+    n_index: int
+    e_index: int
+    node_lookup: list[Optional[Node]]
 
-    def add_nodes_from(self, nodes_for_adding: Iterable[Node], **attr):
-        for node_for_adding in nodes_for_adding:
-            self.add_node(node_for_adding, **attr)
-
-    def remove_node(self, n: Node):
-        idx = self.node_index(n)
-        for u in list(self.neighbors(n)):
-            self.remove_edge(n, u)
-        self.node_lookup[idx] = None
-        super().remove_node(n)
-
-        for L in self.listeners:
-            L.node_removed(idx, n)
-
-    def remove_nodes_from(self, nodes: Iterable[Node]):
-        for n in nodes:
-            self.remove_node(n)
-
-    def add_edge(self, u_of_edge: Node, v_of_edge: Node, **attr):
-        # call super, adding in the index value
-        if not self.has_node(u_of_edge):
-            self.add_node(u_of_edge)
-        if not self.has_node(v_of_edge):
-            self.add_node(v_of_edge)
-
-        attr[EDGE_INDEX] = self.e_index
-        super().add_edge(u_of_edge, v_of_edge, **attr)
-
-        uidx = self.node_index(u_of_edge)
-        vidx = self.node_index(v_of_edge)
-        for L in self.listeners:
-            L.edge_added(self.e_index, uidx, vidx, attr)
-        self.e_index += 1
-
-    def add_edges_from(self, ebunch_to_add: EdgeBunch, **attr):
-        for e in ebunch_to_add:
-            if len(e) == 2:
-                u, v = e
-            elif len(e) == 3:
-                u, v, dd = e
-                attr.update(dd)
-            else:
-                raise NetworkXError(f"Edge tuple {e} must be a 2-tuple or 3-tuple.")
-            self.add_edge(u, v, **attr)
-
-    def remove_edge(self, u: Node, v: Node):
-        eidx, uidx, vidx = self.edge_indices(u, v)
-        super().remove_edge(u, v)
-
-        for L in self.listeners:
-            L.edge_removed(eidx, uidx, vidx)
-
-    def remove_edges_from(self, ebunch: EdgeBunch):
-        for e in ebunch:
-            self.remove_edge(*e)
-
-
-class D3DiGraph(DiGraph):
-    listeners: list[D3Listener] = []
-    n_index = 0
-    e_index = 0
-    node_lookup = []
+    # Provided by Graph / DiGraph
+    _node: dict
+    _adj: dict
 
     def __init__(self, incoming_graph_data=None, **attr):
-        super().__init__(incoming_graph_data, **attr)
         self.listeners = []
         self.n_index = 0
         self.e_index = 0
         self.node_lookup = []
-        for u in self.nodes():
-            self.nodes[u][NODE_INDEX] = self.n_index
-            self.node_lookup.append(u)
-            self.n_index += 1
-        for u, v in self.edges:
-            self.edges[u, v][EDGE_INDEX] = self.e_index
+        super().__init__(incoming_graph_data, **attr)  # type: ignore
+        # Converting graph data can replace the node attribute dicts, so index the
+        # nodes and edges in order afterwards
+        self.node_lookup = list(self._node)
+        for i, data in enumerate(self._node.values()):
+            data[NODE_INDEX] = i
+        self.n_index = len(self.node_lookup)
+        self.e_index = 0
+        for *_, data in self.edges(data=True):  # type: ignore
+            data[EDGE_INDEX] = self.e_index
             self.e_index += 1
 
     def add_listener(self, L: D3Listener):
@@ -161,22 +83,39 @@ class D3DiGraph(DiGraph):
         if L in self.listeners:
             self.listeners.remove(L)
 
+    def _notify(self, bulk: str, single: str, *columns: list):
+        if not columns[0]:
+            return
+        for L in self.listeners:
+            if hasattr(L, bulk):
+                getattr(L, bulk)(*columns)
+            else:
+                callback = getattr(L, single)
+                for args in zip(*columns):
+                    callback(*args)
+
     def node_by_index(self, nidx: int) -> Node:
         return self.node_lookup[nidx]
 
     def node_index(self, n: Node) -> int:
-        return self.nodes[n][NODE_INDEX]
+        return self._node[n][NODE_INDEX]
 
     def edge_index(self, u: Node, v: Node) -> int:
-        return self.edges[u, v][EDGE_INDEX]
+        return self._adj[u][v][EDGE_INDEX]
 
     def edge_indices(self, u: Node, v: Node):
         return self.edge_index(u, v), self.node_index(u), self.node_index(v)
 
     def add_node(self, node_for_adding: Node, **attr):
+        attr = _without_index(attr, NODE_INDEX)
+        if node_for_adding in self._node:
+            # Only update the attributes of an existing node
+            super().add_node(node_for_adding, **attr)  # type: ignore
+            return
+
         # call super, adding in the index value
         attr[NODE_INDEX] = self.n_index
-        super().add_node(node_for_adding, **attr)
+        super().add_node(node_for_adding, **attr)  # type: ignore
         self.node_lookup.append(node_for_adding)
 
         for L in self.listeners:
@@ -184,32 +123,76 @@ class D3DiGraph(DiGraph):
         self.n_index += 1
 
     def add_nodes_from(self, nodes_for_adding: Iterable[Node], **attr):
-        for node_for_adding in nodes_for_adding:
-            self.add_node(node_for_adding, **attr)
+        attr = _without_index(attr, NODE_INDEX)
+        items, keys = [], []
+        for n in nodes_for_adding:
+            try:
+                n not in self._node
+                key = n
+            except TypeError:
+                # (node, attribute dict) pair, as in networkx
+                key, ndict = n  # type: ignore
+                n = (key, _without_index(ndict, NODE_INDEX))
+            items.append(n)
+            keys.append(key)
+        super().add_nodes_from(items, **attr)  # type: ignore
+
+        # New nodes are the ones without an index yet
+        new_nodes, new_data = [], []
+        for n in keys:
+            data = self._node[n]
+            if NODE_INDEX not in data:
+                data[NODE_INDEX] = self.n_index + len(new_nodes)
+                new_nodes.append(n)
+                new_data.append(data)
+        nidxs = list(range(self.n_index, self.n_index + len(new_nodes)))
+        self.node_lookup.extend(new_nodes)
+        self.n_index += len(new_nodes)
+        self._notify("nodes_added", "node_added", nidxs, new_nodes, new_data)
+
+    def _incident_edges(self, nodes: Iterable[Node]) -> list[Edge]:
+        """Every edge into or out of the nodes, once each"""
+        if self.is_directed():  # type: ignore
+            nodes = list(nodes)
+            edges = dict.fromkeys(self.out_edges(nodes))  # type: ignore
+            edges.update(dict.fromkeys(self.in_edges(nodes)))  # type: ignore
+            return list(edges)
+        return list(self.edges(nodes))  # type: ignore
 
     def remove_node(self, n: Node):
         idx = self.node_index(n)
-        for u in list(self.neighbors(n)):
-            self.remove_edge(n, u)
+        for u, v in self._incident_edges([n]):
+            self.remove_edge(u, v)
         self.node_lookup[idx] = None
-        super().remove_node(n)
+        super().remove_node(n)  # type: ignore
 
         for L in self.listeners:
             L.node_removed(idx, n)
 
     def remove_nodes_from(self, nodes: Iterable[Node]):
-        for n in nodes:
-            self.remove_node(n)
+        nodes = [n for n in dict.fromkeys(nodes) if n in self._node]
+        self.remove_edges_from(self._incident_edges(nodes))
+        nidxs = [self._node[n][NODE_INDEX] for n in nodes]
+        for idx in nidxs:
+            self.node_lookup[idx] = None
+        super().remove_nodes_from(nodes)  # type: ignore
+        self._notify("nodes_removed", "node_removed", nidxs, nodes)
 
     def add_edge(self, u_of_edge: Node, v_of_edge: Node, **attr):
         # call super, adding in the index value
-        if not self.has_node(u_of_edge):
+        if u_of_edge not in self._node:
             self.add_node(u_of_edge)
-        if not self.has_node(v_of_edge):
+        if v_of_edge not in self._node:
             self.add_node(v_of_edge)
 
+        attr = _without_index(attr, EDGE_INDEX)
+        if v_of_edge in self._adj[u_of_edge]:
+            # Only update the attributes of an existing edge
+            super().add_edge(u_of_edge, v_of_edge, **attr)  # type: ignore
+            return
+
         attr[EDGE_INDEX] = self.e_index
-        super().add_edge(u_of_edge, v_of_edge, **attr)
+        super().add_edge(u_of_edge, v_of_edge, **attr)  # type: ignore
 
         uidx = self.node_index(u_of_edge)
         vidx = self.node_index(v_of_edge)
@@ -218,23 +201,68 @@ class D3DiGraph(DiGraph):
         self.e_index += 1
 
     def add_edges_from(self, ebunch_to_add: EdgeBunch, **attr):
+        attr = _without_index(attr, EDGE_INDEX)
+        edges = []
         for e in ebunch_to_add:
-            if len(e) == 2:
-                u, v = e
-            elif len(e) == 3:
-                u, v, dd = e
-                attr.update(dd)
+            if len(e) == 3:
+                u, v, dd = e  # type: ignore
+                edges.append((u, v, _without_index(dd, EDGE_INDEX)))
+            elif len(e) == 2:
+                edges.append(e)
             else:
                 raise NetworkXError(f"Edge tuple {e} must be a 2-tuple or 3-tuple.")
-            self.add_edge(u, v, **attr)
+
+        # Add new endpoints first, so listeners hear about them before the edges
+        self.add_nodes_from(
+            n
+            for n in dict.fromkeys(n for e in edges for n in e[:2])
+            if n not in self._node
+        )
+        super().add_edges_from(edges, **attr)  # type: ignore
+
+        # New edges are the ones without an index yet
+        eidxs, uidxs, vidxs, new_data = [], [], [], []
+        for u, v, *_ in edges:
+            data = self._adj[u][v]
+            if EDGE_INDEX not in data:
+                data[EDGE_INDEX] = self.e_index + len(eidxs)
+                eidxs.append(data[EDGE_INDEX])
+                uidxs.append(self._node[u][NODE_INDEX])
+                vidxs.append(self._node[v][NODE_INDEX])
+                new_data.append(data)
+        self.e_index += len(eidxs)
+        self._notify("edges_added", "edge_added", eidxs, uidxs, vidxs, new_data)
 
     def remove_edge(self, u: Node, v: Node):
         eidx, uidx, vidx = self.edge_indices(u, v)
-        super().remove_edge(u, v)
+        super().remove_edge(u, v)  # type: ignore
 
         for L in self.listeners:
             L.edge_removed(eidx, uidx, vidx)
 
     def remove_edges_from(self, ebunch: EdgeBunch):
+        # Like networkx, edges that aren't in the graph are ignored
+        removed: dict[int, tuple[int, int]] = {}
+        edges = []
         for e in ebunch:
-            self.remove_edge(*e)
+            u, v = e[:2]
+            if u in self._adj and v in self._adj[u]:
+                eidx = self._adj[u][v][EDGE_INDEX]
+                removed[eidx] = (self._node[u][NODE_INDEX], self._node[v][NODE_INDEX])
+                edges.append((u, v))
+        super().remove_edges_from(edges)  # type: ignore
+        self._notify(
+            "edges_removed",
+            "edge_removed",
+            list(removed),
+            [uidx for uidx, _ in removed.values()],
+            [vidx for _, vidx in removed.values()],
+        )
+
+
+class D3Graph(_D3GraphMixin, Graph):
+    pass
+
+
+class D3DiGraph(_D3GraphMixin, DiGraph):
+    pass
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import math
 import socket
+import sys
 import tempfile
+from array import array
+from collections import deque
 from datetime import timedelta
+from itertools import groupby
 from json import dumps
 from os import remove
 from os.path import dirname
 from os.path import join as pathjoin
 from random import randint
 from time import sleep
-from typing import Iterable, Optional
+from typing import Any, Iterable, Optional, Union
 from webbrowser import open_new
 
 import tornado.httpserver
@@ -53,8 +58,10 @@ class WSHandler(tornado.websocket.WebSocketHandler):
             # self.write_message('1')
 
     def send_to_visualizers(self, message):
+        # Binary frames (graph snapshots) have to be forwarded as binary
+        binary = isinstance(message, bytes)
         for c in visualizer_clients:
-            c.write_message(message)
+            c.write_message(message, binary=binary)
 
     def on_close(self):
         if self in websocket_clients:
@@ -164,6 +171,101 @@ async def create_d3nx_visualizer(
     return d3
 
 
+# Updates to the same key within a frame replace each other
+_COALESCED = {"!n": "nid", "!e": "eid", "mn": "nid", "ti": None}
+
+
+class _UpdateFrame:
+    """Updates sent to the visualizer together, in order, ending with a redraw.
+
+    Style, position and title updates overwrite an earlier one for the same node or
+    edge in the frame. The frame is sent as one "bt" message: a JSON list of runs of
+    consecutive updates of the same kind, each as `[kind, {key: [values...]}]` (or
+    `[kind]` for updates without data).
+    """
+
+    def __init__(self):
+        self.entries: list[tuple[str, Optional[dict[str, Any]]]] = []
+        self.closed = False
+        self._slots: dict[tuple, int] = {}
+
+    def add(self, kind: str, data: Optional[dict[str, Any]] = None):
+        if kind == "cc":
+            # Updates before a clear mustn't absorb the ones after it
+            self._slots.clear()
+        elif kind in _COALESCED and data is not None:
+            id_key = _COALESCED[kind]
+            key = (kind, None if id_key is None else data[id_key])
+            if key in self._slots:
+                self.entries[self._slots[key]] = (kind, data)
+                return
+            self._slots[key] = len(self.entries)
+        self.entries.append((kind, data))
+        if kind == "up":
+            self.closed = True
+
+    def encode(self) -> str:
+        runs: list[list] = []
+        for kind, group in groupby(self.entries, key=lambda entry: entry[0]):
+            updates = [data for _, data in group if data is not None]
+            if not updates:
+                runs.append([kind])
+                continue
+            keys = dict.fromkeys(key for data in updates for key in data)
+            runs.append(
+                [kind, {key: [data.get(key) for data in updates] for key in keys}]
+            )
+        return f"bt{dumps(runs, separators=(',', ':'))}"
+
+
+# Arrays of a binary snapshot, in the order they follow the header
+_SNAPSHOT_ARRAYS = {
+    "nid": "i",
+    "x": "f",
+    "y": "f",
+    "eid": "i",
+    "source": "i",
+    "target": "i",
+}
+
+
+def _coordinate(value) -> Optional[float]:
+    """Position coordinate for a snapshot, None if missing or not finite (JSON has no
+    NaN)"""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _encode_snapshot(snapshot: dict[str, Any]) -> bytes:
+    """Binary snapshot message for the visualizer.
+
+    Layout: b"sg", the header length (uint32), a JSON header with the titles, styles
+    and array lengths, padding to a multiple of 4 bytes, then the arrays as
+    little-endian int32/float32 (missing positions are NaN).
+    """
+    arrays = []
+    for name, typecode in _SNAPSHOT_ARRAYS.items():
+        values = snapshot[name]
+        if typecode == "f":
+            values = [math.nan if v is None else v for v in values]
+        arrays.append(array(typecode, values))
+    header = {
+        key: value for key, value in snapshot.items() if key not in _SNAPSHOT_ARRAYS
+    }
+    header["arrays"] = [
+        [name, typecode, len(a)]
+        for (name, typecode), a in zip(_SNAPSHOT_ARRAYS.items(), arrays)
+    ]
+    encoded = dumps(header, separators=(",", ":")).encode()
+    prefix = b"sg" + len(encoded).to_bytes(4, "little") + encoded
+    parts = [prefix, bytes(-len(prefix) % 4)]
+    for a in arrays:
+        if sys.byteorder == "big":
+            a.byteswap()
+        parts.append(a.tobytes())
+    return b"".join(parts)
+
+
 class D3NetworkxRenderer(object):
     MAGICKEY = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
 
@@ -192,11 +294,33 @@ class D3NetworkxRenderer(object):
         self._highlighted_nodes = set()
         self._highlighted_edges = set()
 
-        self.updates_todo = []
+        # Frames waiting to be sent, oldest first, and binary snapshots. The last frame
+        # may still be open.
+        self.updates_todo: deque[Union[_UpdateFrame, bytes]] = deque()
 
         self.start_server()
 
-    def set_graph(self, graph: D3Graph | D3DiGraph):
+    def set_graph(
+        self,
+        graph: D3Graph | D3DiGraph,
+        snapshot=True,
+        binary=False,
+        pos: Optional[str] = "pos",
+    ):
+        """Show a graph in the visualizer and follow its changes.
+
+        Parameters
+        ----------
+        graph: D3Graph | D3DiGraph
+        snapshot: bool
+            Send the nodes and edges the graph already has as one message, instead of
+            one update per node and edge
+        binary: bool
+            Send the snapshot as a binary message of typed arrays instead of JSON
+        pos: str (optional)
+            Node attribute with (x, y) positions to place the nodes at in the snapshot.
+            Nodes with positions are fixed there; the others are placed by the layout.
+        """
         self.clear()
         if graph is None:
             return
@@ -204,16 +328,31 @@ class D3NetworkxRenderer(object):
         self._directed = isinstance(graph, DiGraph)
         self._graph.add_listener(self)
 
-        # Add nodes and edges if graph already has them
-        if self._graph.number_of_nodes() > 0:
-            for n in self._graph.nodes():
-                self.node_added(self._graph.node_index(n), n, self._graph.nodes[n])
-            for u, v, *_ in self._graph.edges():
-                self.edge_added(*self._graph.edge_indices(u, v), self._graph[u][v])
+        if self._graph.number_of_nodes() == 0:
+            return
+        if snapshot:
+            data = self._snapshot(pos)
+            if binary:
+                self.updates_todo.append(_encode_snapshot(data))
+            else:
+                self._send_update("sg", data)
+            if self.interactive:
+                self.update()
+            return
+
+        # Add nodes and edges if graph already has them, as one frame even in
+        # interactive mode
+        interactive, self.interactive = self.interactive, False
+        for n in self._graph.nodes():
+            self.node_added(self._graph.node_index(n), n, self._graph.nodes[n])
+        for u, v, *_ in self._graph.edges():
+            self.edge_added(*self._graph.edge_indices(u, v), self._graph[u][v])
+        self.interactive = interactive
+        if interactive:
+            self.update()
 
     def set_title(self, newtitle: str):
-        ti = {"titlename": newtitle}
-        self._send_update(f"ti{dumps(ti)}")
+        self._send_update("ti", {"titlename": newtitle})
         self.update()
 
     def clear(self):
@@ -223,6 +362,7 @@ class D3NetworkxRenderer(object):
         self.update()
 
     def update(self):
+        """Redraw the visualizer with all the updates sent so far"""
         self._send_update("up")
 
     def set_event_delay(self, delay: float):
@@ -236,7 +376,7 @@ class D3NetworkxRenderer(object):
         if self._graph is None:
             raise GraphNotSetError
         mv_node = {"nid": self._graph.node_index(n), "fixed": True, "cx": x, "cy": y}
-        self._send_update(f"mn{dumps(mv_node)}")
+        self._send_update("mn", mv_node)
 
     # data is a list of tuples with form (node_object, x, y)
     def position_nodes(self, data):
@@ -248,7 +388,7 @@ class D3NetworkxRenderer(object):
         if self._graph is None:
             raise GraphNotSetError
         self._send_update(
-            f"!n{self._node_update(self._graph.node_index(n), n, style_dict)}"
+            "!n", self._node_update(self._graph.node_index(n), n, style_dict)
         )
 
     def stylize_nodes(self, nodes: Iterable[Node], style_dict: NodeStyle):
@@ -260,7 +400,7 @@ class D3NetworkxRenderer(object):
         if self._graph is None:
             raise GraphNotSetError
         self._send_update(
-            f"!e{self._edge_update(*self._graph.edge_indices(u, v), style_dict)}"
+            "!e", self._edge_update(*self._graph.edge_indices(u, v), style_dict)
         )
 
     def stylize_edges(self, ebunch: Iterable[Edge], style_dict: EdgeStyle):
@@ -269,21 +409,41 @@ class D3NetworkxRenderer(object):
 
     # Automatically called, do not call directly
     def node_added(self, nidx: int, n: Node, data: dict):
-        self._send_update(f"+n{self._node_update(nidx, n)}")
+        self._send_update("+n", self._node_update(nidx, n))
 
     # Automatically called, do not call directly
     def node_removed(self, nidx: int, n: Node):
-        rm_node = {"nid": nidx}
-        self._send_update(f"-n{dumps(rm_node)}")
+        self._send_update("-n", {"nid": nidx})
 
     # Automatically called, do not call directly
     def edge_added(self, eidx: int, uidx: int, vidx: int, data: dict):
-        self._send_update(f"+e{self._edge_update(eidx, uidx, vidx)}")
+        self._send_update("+e", self._edge_update(eidx, uidx, vidx))
 
     # Automatically called, do not call directly
     def edge_removed(self, eidx: int, uidx: int, vidx: int):
-        rm_edge = {"eid": eidx}
-        self._send_update(f"-e{dumps(rm_edge)}")
+        self._send_update("-e", {"eid": eidx})
+
+    # Automatically called for bulk changes, do not call directly
+    def nodes_added(self, nidxs: list[int], nodes: list[Node], data: list[dict]):
+        self._send_updates(
+            "+n", [self._node_update(nidx, n) for nidx, n in zip(nidxs, nodes)]
+        )
+
+    # Automatically called for bulk changes, do not call directly
+    def nodes_removed(self, nidxs: list[int], nodes: list[Node]):
+        self._send_updates("-n", [{"nid": nidx} for nidx in nidxs])
+
+    # Automatically called for bulk changes, do not call directly
+    def edges_added(
+        self, eidxs: list[int], uidxs: list[int], vidxs: list[int], data: list[dict]
+    ):
+        self._send_updates(
+            "+e", [self._edge_update(*indices) for indices in zip(eidxs, uidxs, vidxs)]
+        )
+
+    # Automatically called for bulk changes, do not call directly
+    def edges_removed(self, eidxs: list[int], uidxs: list[int], vidxs: list[int]):
+        self._send_updates("-e", [{"eid": eidx} for eidx in eidxs])
 
     # Highlighting Nodes
     def highlight_nodes(self, nodes: Iterable[Node]):
@@ -306,7 +466,9 @@ class D3NetworkxRenderer(object):
         self._highlighted_edges = set()
 
     # Helper functions for sending updates
-    def _node_update(self, nidx, nobj, style_dict: Optional[NodeStyle] = None):
+    def _node_update(
+        self, nidx, nobj, style_dict: Optional[NodeStyle] = None
+    ) -> dict[str, Any]:
         if style_dict is None:
             style_dict = {}
         update_node = {"nid": nidx, "ntitle": ""}
@@ -315,9 +477,11 @@ class D3NetworkxRenderer(object):
         final_style = self.default_node_style.copy()
         final_style.update(style_dict)
         update_node.update(final_style)
-        return dumps(update_node)
+        return update_node
 
-    def _edge_update(self, eidx, uidx, vidx, style_dict: Optional[EdgeStyle] = None):
+    def _edge_update(
+        self, eidx, uidx, vidx, style_dict: Optional[EdgeStyle] = None
+    ) -> dict[str, Any]:
         if style_dict is None:
             style_dict = {}
         update_edge = {
@@ -329,26 +493,76 @@ class D3NetworkxRenderer(object):
         final_style = self.default_edge_style.copy()
         final_style.update(style_dict)
         update_edge.update(final_style)
-        return dumps(update_edge)
+        return update_edge
+
+    def _snapshot(self, pos: Optional[str]) -> dict[str, Any]:
+        """Every node and edge of the graph as arrays, with the default styles"""
+        assert self._graph is not None
+        nid, ntitle, x, y = [], [], [], []
+        for n, data in self._graph.nodes(data=True):
+            nid.append(data[NODE_INDEX])
+            ntitle.append(str(n))
+            xy = None if pos is None else data.get(pos)
+            x.append(None if xy is None else _coordinate(xy[0]))
+            y.append(None if xy is None else _coordinate(xy[1]))
+
+        node_index = dict(zip(self._graph.nodes(), nid))
+        eid, source, target = [], [], []
+        for u, v, eidx in self._graph.edges(data=EDGE_INDEX):
+            eid.append(eidx)
+            source.append(node_index[u])
+            target.append(node_index[v])
+
+        return {
+            "nid": nid,
+            "ntitle": ntitle,
+            "x": x,
+            "y": y,
+            "eid": eid,
+            "source": source,
+            "target": target,
+            "directed": int(self._directed),
+            "nstyle": self.default_node_style,
+            "estyle": self.default_edge_style,
+        }
 
-    def _send_update(self, update=None):
-        if update is not None:
-            self.updates_todo.append(update)
-            # print('Appended to the todo: '+update)
-            if self.interactive:
-                self.updates_todo.append("up")
+    def _open_frame(self) -> _UpdateFrame:
+        last = self.updates_todo[-1] if self.updates_todo else None
+        if not isinstance(last, _UpdateFrame) or last.closed:
+            last = _UpdateFrame()
+            self.updates_todo.append(last)
+        return last
+
+    def _send_update(self, kind: str, data: Optional[dict[str, Any]] = None):
+        frame = self._open_frame()
+        frame.add(kind, data)
+        # In interactive mode, every update is drawn as its own step
+        if self.interactive and kind != "up":
+            frame.add("up")
+
+    def _send_updates(self, kind: str, updates: list[dict[str, Any]]):
+        """Queue updates of one kind, drawn as a single step in interactive mode"""
+        if not updates:
+            return
+        frame = self._open_frame()
+        for data in updates:
+            frame.add(kind, data)
+        if self.interactive:
+            frame.add("up")
 
     def _write_update(self):
         if self.client is None or asyncio.isfuture(self.client):
             print("NetworkX client is still loading.")
             return
 
-        while len(self.updates_todo) > 0:
-            update = self.updates_todo.pop(0)
-            self.client.write_message(update)
-            # print('Client Wrote: '+update)
-            if update == "up":
-                break
+        # Send one frame per tick. An open frame is sent as it is, and later updates
+        # start a new one.
+        if self.updates_todo:
+            frame = self.updates_todo.popleft()
+            if isinstance(frame, bytes):
+                self.client.write_message(frame, binary=True)
+            elif frame.entries:
+                self.client.write_message(frame.encode())
         tornado.ioloop.IOLoop.current().add_timeout(
             timedelta(milliseconds=int(self.event_delay * 1000)), self._write_update
         )
@@ -0,0 +1,559 @@
+"""Centrality measures over the arrays of a `CompiledGraph`."""
+
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from numpy.typing import ArrayLike, NDArray
+from scipy.sparse.csgraph import dijkstra
+from scipy.sparse.linalg import bicgstab, eigs, spsolve, svds
+
+from dcns.compiled_graph import CompiledGraph, compile_graph
+from dcns.graph_utils import Graph, Node
+from dcns.percolation import SeedLike
+
+SparseMatrix = Union[sp.spmatrix, sp.csr_array]
+
+# scipy < 1.12 calls the relative tolerance of the iterative solvers `tol`
+_RTOL = "rtol" if "rtol" in inspect.signature(bicgstab).parameters else "tol"
+
+
+class Betweenness(NamedTuple):
+    """Betweenness centrality indexed like the nodes and edges of a `CompiledGraph`"""
+
+    node: NDArray[np.floating]
+    edge: Optional[NDArray[np.floating]]
+    """Edge betweenness, if requested"""
+    node_stderr: Optional[NDArray[np.floating]]
+    """Standard error of the node betweenness when sampling sources"""
+    edge_stderr: Optional[NDArray[np.floating]]
+    """Standard error of the edge betweenness when sampling sources"""
+    sources: NDArray[np.intp]
+    """Indices of the source nodes that were searched"""
+
+
+class _Arcs(NamedTuple):
+    """Directed arcs of a compiled graph (undirected edges appear in both directions)"""
+
+    num_nodes: int
+    src: NDArray[np.intp]
+    dst: NDArray[np.intp]
+    weight: NDArray[np.floating]
+    edge: NDArray[np.intp]
+    """Edge index of each arc"""
+    num_edges: int
+
+    def csr(self) -> sp.csr_array:
+        N = self.num_nodes
+        return sp.csr_array((self.weight, (self.src, self.dst)), shape=(N, N))
+
+
+def _arcs(cg: CompiledGraph) -> _Arcs:
+    edge = np.arange(cg.num_edges)
+    if cg.directed:
+        return _Arcs(cg.num_nodes, cg.src, cg.dst, cg.weight, edge, cg.num_edges)
+    return _Arcs(
+        cg.num_nodes,
+        np.concatenate((cg.src, cg.dst)),
+        np.concatenate((cg.dst, cg.src)),
+        np.concatenate((cg.weight, cg.weight)),
+        np.concatenate((edge, edge)),
+        cg.num_edges,
+    )
+
+
+def _plateau_levels(
+    s: int,
+    src: NDArray[np.intp],
+    dst: NDArray[np.intp],
+    tight: NDArray[np.intp],
+    zero_weight: NDArray[np.bool_],
+    num_nodes: int,
+):
+    """Order the nodes joined by zero-weight tight arcs, which share a distance.
+
+    Returns the depth of each node along zero-weight arcs, and the tight arcs to keep.
+    If the zero-weight arcs are acyclic, the depth is the longest path and every arc is
+    kept. Otherwise the depth is the fewest hops, and only the zero-weight arcs that go
+    one hop deeper are kept, so zero-weight cycles don't create infinitely many paths.
+    """
+    level = np.zeros(num_nodes)
+    zero = tight[zero_weight[tight]]
+    if len(zero) == 0:
+        return level, tight
+
+    for _ in range(len(zero) + 1):
+        new_level = level.copy()
+        np.maximum.at(new_level, dst[zero], level[src[zero]] + 1)
+        if np.array_equal(new_level, level):
+            return level, tight
+        level = new_level
+
+    level[dst[zero]] = np.inf
+    level[dst[tight[~zero_weight[tight]]]] = 0
+    level[s] = 0
+    for _ in range(len(zero)):
+        new_level = level.copy()
+        np.minimum.at(new_level, dst[zero], level[src[zero]] + 1)
+        if np.array_equal(new_level, level):
+            break
+        level = new_level
+    forward = level[dst[zero]] == level[src[zero]] + 1
+    return level, np.union1d(tight[~zero_weight[tight]], zero[forward])
+
+
+def _brandes_chunk(
+    arcs: _Arcs,
+    sources: NDArray[np.intp],
+    endpoints: bool,
+    edges: bool,
+    batch_size: int = 64,
+):
+    """Sum the dependencies (and their squares) of a chunk of source nodes.
+
+    Distances come from scipy's Dijkstra, a batch of sources at a time. The shortest
+    path DAG of each source is then the set of tight arcs (d[u] + w == d[v]), and the
+    path counts and dependencies are accumulated over those arcs sorted by d[u].
+    """
+    N, src, dst, w = arcs.num_nodes, arcs.src, arcs.dst, arcs.weight
+    E = arcs.num_edges
+    A = arcs.csr()
+    zero_weight = w == 0
+
+    node_sum, node_sq = np.zeros(N), np.zeros(N)
+    edge_sum, edge_sq = (np.zeros(E), np.zeros(E)) if edges else (None, None)
+
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start : start + batch_size]
+        dist = np.atleast_2d(dijkstra(A, directed=True, indices=batch))
+        for s, d in zip(batch.tolist(), dist):
+            reached = np.isfinite(d)
+            d_src, d_dst = d[src], d[dst]
+            with np.errstate(invalid="ignore"):
+                tight = reached[src] & (
+                    np.abs(d_src + w - d_dst) <= 1e-9 * np.maximum(d_dst, 1)
+                )
+            tight = np.flatnonzero(tight)
+
+            level, tight = _plateau_levels(s, src, dst, tight, zero_weight, N)
+            order = tight[np.lexsort((level[src[tight]], d_src[tight]))]
+            us, vs = src[order].tolist(), dst[order].tolist()
+
+            sigma = [0.0] * N
+            sigma[s] = 1.0
+            for u, v in zip(us, vs):
+                sigma[v] += sigma[u]
+
+            delta = [0.0] * N
+            flow = [0.0] * len(us)
+            for i in range(len(us) - 1, -1, -1):
+                u, v = us[i], vs[i]
+                c = sigma[u] / sigma[v] * (1 + delta[v])
+                delta[u] += c
+                flow[i] = c
+
+            dependency = np.array(delta)
+            if endpoints:
+                dependency[reached] += 1
+                dependency[s] = np.count_nonzero(reached) - 1
+            else:
+                dependency[s] = 0
+            node_sum += dependency
+            node_sq += dependency**2
+            if edges:
+                edge_dependency = np.bincount(arcs.edge[order], flow, minlength=E)
+                edge_sum += edge_dependency  # type: ignore
+                edge_sq += edge_dependency**2  # type: ignore
+
+    return node_sum, node_sq, edge_sum, edge_sq
+
+
+def _rescale(
+    values: NDArray[np.floating],
+    n: int,
+    normalized: bool,
+    directed: bool,
+    endpoints: bool,
+    k: Optional[int] = None,
+    is_source: Optional[NDArray[np.bool_]] = None,
+) -> NDArray[np.floating]:
+    """Scale summed dependencies the same way as networkx"""
+    N = n if endpoints else n - 1
+    if N < 2:
+        return values
+    correction = 1 if directed else 2
+    if k is None or endpoints:
+        K = N if k is None else k
+        scale = 1 / (K * (N - 1)) if normalized else N / (K * correction)
+        return values * scale
+
+    # When sampling without endpoints, source nodes only get dependencies from the
+    # other k - 1 sources
+    if normalized:
+        scale_source = 1 / ((k - 1) * (N - 1)) if k > 1 else np.nan
+        scale_nonsource = 1 / (k * (N - 1))
+    else:
+        scale_source = N / ((k - 1) * correction) if k > 1 else np.nan
+        scale_nonsource = N / (k * correction)
+    return values * np.where(is_source, scale_source, scale_nonsource)  # type: ignore
+
+
+def betweenness(
+    cg: CompiledGraph,
+    k: Optional[int] = None,
+    sources: Optional[ArrayLike] = None,
+    normalized=True,
+    endpoints=False,
+    edges=False,
+    unweighted=False,
+    workers: Optional[int] = None,
+    seed: SeedLike = None,
+) -> Betweenness:
+    """Weighted betweenness centrality (Brandes) of a compiled graph.
+
+    Source nodes are split into chunks that run on a process pool, and the dependency
+    sums of the chunks are added up. The scaling matches `nx.betweenness_centrality`
+    and `nx.edge_betweenness_centrality`.
+
+    Parameters
+    ----------
+    cg: CompiledGraph
+        Edge weights must be non-negative. Paths through zero-weight cycles only count
+        the fewest-hop way around them.
+    k: int (optional)
+        Approximate the betweenness from k randomly sampled source nodes. The standard
+        error of each value is returned as well.
+    sources: array of int (optional)
+        Indices of the source nodes to sample instead of random ones
+    normalized: bool
+    endpoints: bool
+        Count the endpoints of each path in the node betweenness
+    edges: bool
+        Also compute the edge betweenness
+    unweighted: bool
+        Measure path length in hops instead of edge weight
+    workers: int (optional)
+        Number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+    seed: int, SeedSequence, or Generator (optional)
+    """
+    arcs = _arcs(cg)
+    if unweighted:
+        arcs = arcs._replace(weight=np.ones_like(arcs.weight))
+    elif np.any(arcs.weight < 0):
+        raise ValueError("Betweenness requires non-negative edge weights")
+
+    n = cg.num_nodes
+    if sources is not None:
+        sources = np.asarray(sources, dtype=np.intp)
+    elif k is not None:
+        sources = np.sort(np.random.default_rng(seed).choice(n, k, replace=False))
+    else:
+        sources = np.arange(n)
+    sampled = len(sources) < n
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [c for c in np.array_split(sources, 4 * workers) if len(c)]
+    if workers == 1:
+        results = [_brandes_chunk(arcs, c, endpoints, edges) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_brandes_chunk, arcs, c, endpoints, edges)
+                for c in chunks
+            ]
+            results = [f.result() for f in futures]
+    node_sum, node_sq, edge_sum, edge_sq = (
+        sum(parts) if parts[0] is not None else None for parts in zip(*results)
+    )
+
+    is_source = np.zeros(n, dtype=bool)
+    is_source[sources] = True
+    k = len(sources) if sampled else None
+    scale_args = (n, normalized, cg.directed)
+    node = _rescale(node_sum, *scale_args, endpoints, k, is_source)
+    edge = _rescale(edge_sum, *scale_args, True, k) if edges else None
+
+    node_stderr = edge_stderr = None
+    if sampled:
+        # The sampled estimate is a scaled sum of the per-source dependencies, so its
+        # standard error follows from their sample variance (with a finite population
+        # correction since sources are drawn without replacement)
+        m = len(sources)
+
+        def sum_stderr(total, total_sq):
+            if m < 2:
+                return np.full_like(total, np.nan)
+            var = np.maximum(total_sq - total**2 / m, 0) / (m - 1)
+            return m * np.sqrt(var / m * (1 - m / n))
+
+        node_stderr = _rescale(
+            sum_stderr(node_sum, node_sq), *scale_args, endpoints, k, is_source
+        )
+        if edges:
+            edge_stderr = _rescale(sum_stderr(edge_sum, edge_sq), *scale_args, True, k)
+
+    return Betweenness(node, edge, node_stderr, edge_stderr, sources)
+
+
+def betweenness_centrality(
+    G: Graph,
+    weight: Optional[str] = "weight",
+    k: Optional[int] = None,
+    normalized=True,
+    endpoints=False,
+    workers: Optional[int] = None,
+    seed: SeedLike = None,
+) -> dict[Node, float]:
+    """Parallel drop-in for `nx.betweenness_centrality`. See `betweenness`."""
+    cg = compile_graph(G, weight=weight, pos=None)
+    result = betweenness(
+        cg,
+        k=k,
+        normalized=normalized,
+        endpoints=endpoints,
+        unweighted=weight is None,
+        workers=workers,
+        seed=seed,
+    )
+    return dict(zip(cg.nodes, result.node.tolist()))
+
+
+def edge_betweenness_centrality(
+    G: Graph,
+    weight: Optional[str] = "weight",
+    k: Optional[int] = None,
+    normalized=True,
+    workers: Optional[int] = None,
+    seed: SeedLike = None,
+) -> dict[tuple[Node, Node], float]:
+    """Parallel drop-in for `nx.edge_betweenness_centrality`. See `betweenness`."""
+    cg = compile_graph(G, weight=weight, pos=None)
+    result = betweenness(
+        cg,
+        k=k,
+        normalized=normalized,
+        edges=True,
+        unweighted=weight is None,
+        workers=workers,
+        seed=seed,
+    )
+    nodes = cg.nodes
+    pairs = zip(cg.src.tolist(), cg.dst.tolist())
+    return {(nodes[u], nodes[v]): b for (u, v), b in zip(pairs, result.edge.tolist())}  # type: ignore
+
+
+def _start_vector(x0: Optional[ArrayLike], n: int) -> NDArray[np.floating]:
+    """Positive starting vector, from a previous result if given"""
+    x = np.ones(n) if x0 is None else np.nan_to_num(np.abs(np.asarray(x0, float)))
+    return x if x.any() else np.ones(n)
+
+
+def _leading_eigenpair(
+    A: SparseMatrix, x0: Optional[ArrayLike] = None, tol=1e-8
+) -> tuple[float, NDArray[np.floating]]:
+    """Largest eigenvalue of a nonnegative matrix and its eigenvector of Aᵀ, with unit
+    Euclidean norm"""
+    N = A.shape[0]
+    if N < 3:
+        # Too small for ARPACK
+        values, vectors = np.linalg.eig(sp.csr_array(A.T, dtype=float).toarray())
+        top = np.argmax(values.real)
+        values, vectors = values[top : top + 1], vectors[:, top : top + 1]
+    else:
+        values, vectors = eigs(
+            sp.csr_array(A.T, dtype=float),
+            k=1,
+            which="LR",
+            v0=_start_vector(x0, N),
+            tol=tol,
+        )
+    # The leading eigenvector is nonnegative; drop the sign and rounding noise
+    x = np.abs(vectors[:, 0].real)
+    return float(values[0].real), x / np.linalg.norm(x)
+
+
+def eigenvector_scores(
+    A: SparseMatrix, x0: Optional[ArrayLike] = None, tol=1e-8
+) -> NDArray[np.floating]:
+    """Eigenvector centrality from the in-edges of each node (like networkx).
+
+    Parameters
+    ----------
+    A: sparse array of shape (N, N)
+        `A[u, v]` is the weight of edge u->v
+    x0: array of shape (N,) (optional)
+        Starting vector, such as the scores of a previous graph version
+    tol: float
+
+    Returns
+    -------
+    float array of shape (N,) with unit Euclidean norm
+    """
+    return _leading_eigenpair(A, x0, tol)[1]
+
+
+def katz_scores(
+    A: SparseMatrix,
+    alpha=0.001,
+    beta=1.0,
+    x0: Optional[ArrayLike] = None,
+    tol=1e-8,
+    normalized=True,
+    max_eigenvalue: Optional[float] = None,
+) -> NDArray[np.floating]:
+    """Katz centrality, the solution of x = α Aᵀx + β (like networkx).
+
+    Solved iteratively from `x0` if given (falling back to a direct solve), so the
+    scores of a previous graph version make a good starting point.
+
+    α must be smaller than 1 / λmax, where λmax is the largest eigenvalue of A, or the
+    series diverges and a ValueError is raised. λmax scales with the edge weights, so
+    weighted graphs (e.g., by number of trips) need a much smaller α. Pass
+    `max_eigenvalue` if λmax is already known, to skip computing it.
+    """
+    if max_eigenvalue is None:
+        max_eigenvalue = _leading_eigenpair(A, tol=tol)[0]
+    if alpha * max_eigenvalue >= 1:
+        raise ValueError(
+            f"Katz alpha {alpha} must be smaller than 1 / largest eigenvalue "
+            f"= {1 / max_eigenvalue:.3g}"
+        )
+
+    N = A.shape[0]
+    M = sp.csr_array(sp.identity(N, format="csr")) - alpha * sp.csr_array(
+        A.T, dtype=float
+    )
+    b = np.broadcast_to(np.asarray(beta, dtype=float), (N,)).copy()
+    x, info = (
+        (None, 1) if x0 is None else bicgstab(M, b, x0=x0, atol=0.0, **{_RTOL: tol})
+    )
+    if info != 0:
+        x = spsolve(sp.csc_array(M), b)
+    if normalized:
+        x = x / (np.sign(x.sum()) * np.linalg.norm(x))
+    return x
+
+
+def pagerank_scores(
+    A: SparseMatrix,
+    alpha=0.85,
+    x0: Optional[ArrayLike] = None,
+    tol=1e-6,
+    max_iter=1000,
+) -> NDArray[np.floating]:
+    """PageRank by power iteration (like networkx), starting from `x0` if given.
+
+    Dangling nodes link to every node uniformly. Stops when the L1 change is below
+    N * tol.
+    """
+    N = A.shape[0]
+    A = sp.csr_array(A, dtype=float)
+    out_weight = np.asarray(A.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    with np.errstate(divide="ignore"):
+        P = sp.csr_array(sp.diags(np.where(dangling, 0, 1 / out_weight))) @ A
+    PT = sp.csr_array(P.T)
+
+    x = _start_vector(x0, N)
+    x /= x.sum()
+    for _ in range(max_iter):
+        x_last = x
+        x = alpha * (PT @ x + x[dangling].sum() / N) + (1 - alpha) / N
+        if np.abs(x - x_last).sum() < N * tol:
+            return x
+    raise RuntimeError(f"PageRank did not converge in {max_iter} iterations")
+
+
+def hits_scores(
+    A: SparseMatrix, x0: Optional[ArrayLike] = None, tol=1e-8
+) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+    """HITS hub and authority scores from the leading singular vectors of A.
+
+    `x0` is a starting vector for the authorities. Both score vectors sum to 1, like
+    networkx.
+
+    Returns
+    -------
+    hubs: float array of shape (N,)
+    authorities: float array of shape (N,)
+    """
+    u, _, vt = svds(
+        sp.csr_array(A, dtype=float), k=1, v0=_start_vector(x0, A.shape[0]), tol=tol
+    )
+    hubs, authorities = np.abs(u[:, 0]), np.abs(vt[0])
+    return hubs / hubs.sum(), authorities / authorities.sum()
+
+
+def spectral_centralities(
+    cg: CompiledGraph,
+    katz_alpha=0.001,
+    katz_beta=1.0,
+    pagerank_alpha=0.85,
+    initial: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Degree, eigenvector, Katz, PageRank and HITS centralities of a compiled graph.
+
+    The weighted adjacency is built once and shared by every measure.
+
+    Parameters
+    ----------
+    cg: CompiledGraph
+    katz_alpha: float
+        Must be smaller than 1 / the largest eigenvalue of the weighted adjacency (see
+        `katz_scores`)
+    katz_beta: float
+    pagerank_alpha: float
+    initial: DataFrame (optional)
+        A previous result, such as for an earlier version of the graph or another
+        service day. Its columns are aligned to the nodes of `cg` by index and used as
+        starting vectors; nodes it doesn't have start at the mean score.
+
+    Returns
+    -------
+    DataFrame indexed by node with columns "degree", "eigenvector", "katz", "pagerank",
+    "hub" and "authority"
+    """
+    A = cg.csr()
+    index = pd.Index(cg.nodes, tupleize_cols=False)
+
+    def start(column: str) -> Optional[NDArray[np.floating]]:
+        if initial is None or column not in initial:
+            return None
+        x = initial[column].reindex(index)
+        return x.fillna(x.mean()).to_numpy(dtype=float)
+
+    hubs, authorities = hits_scores(A, start("authority"))
+    degree = np.bincount(cg.src, minlength=cg.num_nodes) + np.bincount(
+        cg.dst, minlength=cg.num_nodes
+    )
+    max_eigenvalue, eigenvector = _leading_eigenpair(A, start("eigenvector"))
+    katz = katz_scores(
+        A, katz_alpha, katz_beta, start("katz"), max_eigenvalue=max_eigenvalue
+    )
+    return pd.DataFrame(
+        {
+            "degree": degree,
+            "eigenvector": eigenvector,
+            "katz": katz,
+            "pagerank": pagerank_scores(A, pagerank_alpha, start("pagerank")),
+            "hub": hubs,
+            "authority": authorities,
+        },
+        index=index,
+    )
+
+
+def centrality_df(
+    G: Graph,
+    weight: Optional[str] = "weight",
+    initial: Optional[pd.DataFrame] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Centrality DataFrame of a networkx graph. See `spectral_centralities`."""
+    return spectral_centralities(
+        compile_graph(G, weight=weight, pos=None), initial=initial, **kwargs
+    )
@@ -1,99 +1,425 @@
 import itertools
+import math
+from collections import defaultdict
+from typing import Iterable, NamedTuple, Optional, Union
 
 import networkx as nx
 import numpy as np
-from numpy.typing import NDArray
-from tqdm import tqdm
+from numpy.typing import ArrayLike, NDArray
+from scipy.spatial import cKDTree
 
-from dcns.graph_utils import GGraph
+from dcns.graph_utils import AttributeStore, GGraph, Graph, Node, PosDict, pos_to_array
+from dcns.spatial import WALKING_SPEED, project_lonlat
 
 
-def convolve_iter(arr: NDArray):
-    """Iterate though an NDArray, yielding a flattened NDArray of the 3x3 surrounding cells."""
-    for i, j in itertools.product(range(arr.shape[0]), range(arr.shape[1])):
-        # get the indices of the cell's neighbors
-        i1 = max(i - 1, 0)
-        i2 = min(i + 2, arr.shape[0])
-        j1 = max(j - 1, 0)
-        j2 = min(j + 2, arr.shape[1])
+def close_pairs(coords: NDArray[np.floating], max_distance: float):
+    """Find all unique pairs of points closer than `max_distance` to each other.
 
-        # sum the values of the cell and its neighbors
-        yield arr[i1:i2, j1:j2].flatten()
+    Parameters
+    ----------
+    coords: float array of shape (N, 2)
+    max_distance: float
 
+    Returns
+    -------
+    i, j: int arrays of shape (P,), with i < j
+    distance: float array of shape (P,)
+    """
+    coords = np.ascontiguousarray(coords, dtype=float)
+    pairs = cKDTree(coords).query_pairs(max_distance, output_type="ndarray")
+    i, j = pairs[:, 0], pairs[:, 1]
+    distance = np.linalg.norm(coords[i] - coords[j], axis=1)
 
-def get_partition_size(node_positions: dict[str, NDArray], num_partitions: int):
-    """Get the (x,y) size of each partition"""
-    # determine the min and max x and y values
-    x_min, y_min = np.min(list(node_positions.values()), axis=0)
-    x_max, y_max = np.max(list(node_positions.values()), axis=0)
+    # query_pairs includes pairs at exactly max_distance
+    keep = distance < max_distance
+    return i[keep], j[keep], distance[keep]
 
-    # calculate the partition size in x and y directions
-    return ((x_max - x_min) / num_partitions, (y_max - y_min) / num_partitions)
 
+class CloseEdgeSweep:
+    """Close edges for every threshold up to `max_distance` from a single pair search.
 
-def partition_nodes(node_positions: dict[str, NDArray], num_partitions: int):
-    """Partition a dictionary of positions into a grid"""
-    # determine the min and max x and y values
-    x_min, y_min = np.min(list(node_positions.values()), axis=0)
-    x_max, y_max = np.max(list(node_positions.values()), axis=0)
+    The candidate pairs are sorted by distance, so the close edges for any threshold
+    <= `max_distance` are a prefix of them.
 
-    # calculate the partition size in x and y directions
-    x_partition_size, y_partition_size = get_partition_size(
-        node_positions, num_partitions
-    )
+    Attributes
+    ----------
+    nodes: list of Nodes
+    i, j: int arrays of shape (P,)
+        Node indices of each pair, sorted by distance
+    distance: float array of shape (P,)
+        In meters if `metric`, else in the units of `pos`
+    max_distance: float
+    metric: bool
+        True if `pos` is (lon, lat) in degrees and distances are in meters
+    """
+
+    def __init__(
+        self,
+        pos: Union[PosDict, AttributeStore],
+        max_distance: float,
+        metric: bool = False,
+    ):
+        self.nodes, coords = pos_to_array(pos)
+        if metric and len(coords):
+            coords = project_lonlat(coords, ref_lat=coords[:, 1].mean())
+        i, j, distance = close_pairs(coords, max_distance)
+        order = np.argsort(distance, kind="stable")
+        self.i, self.j, self.distance = i[order], j[order], distance[order]
+        self.max_distance = max_distance
+        self.metric = metric
+
+    @classmethod
+    def from_graph(cls, G: Graph, max_distance: float, attr="pos", metric=False):
+        return cls(nx.get_node_attributes(G, attr), max_distance, metric=metric)
+
+    def count(self, max_distance: Union[float, ArrayLike]):
+        """Number of pairs closer than `max_distance` (or each of an array of them)"""
+        if np.any(np.asarray(max_distance) > self.max_distance):
+            raise ValueError(
+                f"max_distance {max_distance} is larger than the sweep's "
+                f"max_distance {self.max_distance}"
+            )
+        return np.searchsorted(self.distance, max_distance, side="left")
+
+    def pairs(self, max_distance: float):
+        """Index arrays (i, j, distance) of the pairs closer than `max_distance`.
+
+        These are views into the sweep's arrays, so no pairs are copied.
+        """
+        n = self.count(max_distance)
+        return self.i[:n], self.j[:n], self.distance[:n]
 
-    # create the partitions array
-    partitions = np.empty((num_partitions, num_partitions), dtype=object)
-    partitions[:] = [
-        [set() for _ in range(partitions.shape[1])] for _ in range(partitions.shape[0])
-    ]
-    # partitions[:] = [[]*num_partitions]*num_partitions
-
-    # assign each node to its corresponding partition
-    for node_name, node_pos in node_positions.items():
-        x_index = int((node_pos[0] - x_min) // x_partition_size) - 1
-        y_index = int((node_pos[1] - y_min) // y_partition_size) - 1
-        partitions[x_index, y_index].add(node_name)
-
-    return partitions
-
-
-def get_close_edges(
-    pos: dict[str, NDArray], max_distance=0.001, num_partitions=50, show_progress=True
-):
-    partitions = partition_nodes(pos, num_partitions)
-    close_edges: set[tuple[str, str]] = set()
-
-    # Make sure our distance threshold is smaller than the size of the partitions
-    x_partition_size, y_partition_size = get_partition_size(pos, num_partitions)
-    if max_distance >= x_partition_size or max_distance >= y_partition_size:
-        raise ValueError(
-            f"Partition size {x_partition_size, y_partition_size} for {num_partitions} "
-            f"partitions is smaller than max_distance {max_distance}"
+    def edges(self, max_distance: float, symmetric=False) -> list[tuple[Node, Node]]:
+        """List of (u, v) node pairs closer than `max_distance`.
+
+        If `symmetric`, both (u, v) and (v, u) are included.
+        """
+        i, j, _ = self.pairs(max_distance)
+        i, j = i.tolist(), j.tolist()
+        nodes = self.nodes
+        edges = [(nodes[u], nodes[v]) for u, v in zip(i, j)]
+        if symmetric:
+            edges.extend((nodes[v], nodes[u]) for u, v in zip(i, j))
+        return edges
+
+    def with_close_edges(self, G: GGraph, max_distance: float, **kwargs) -> GGraph:
+        """Copy of a graph with close edges (in both directions) below `max_distance`"""
+        G_ = G.__class__(G)
+        G_.add_edges_from(
+            ebunch_to_add=self.edges(max_distance, symmetric=True), **kwargs
         )
+        return G_  # type: ignore
 
-    for cell in tqdm(
-        convolve_iter(partitions), total=num_partitions**2, disable=not show_progress
-    ):
-        nodes = set.union(*cell)
-        # total_combinations = len(nodes) * (len(nodes)-1)
-
-        close_edges.update(
-            (u, v)
-            for u, v in itertools.combinations(nodes, 2)
-            # ), total=total_combinations, desc="Nodes in cell")
-            if np.linalg.norm(pos[u] - pos[v]) < max_distance
+    def walking_edges(
+        self,
+        max_distance: float,
+        walking_speed=WALKING_SPEED,
+        time_attr="avg_trip_time",
+        length_attr="length",
+        **attr,
+    ) -> list[tuple[Node, Node, dict]]:
+        """List of (u, v, data) close edges in both directions, where `data` has the
+        edge length and walking time.
+
+        Parameters
+        ----------
+        max_distance: float
+            Maximum length in meters
+        walking_speed: float
+            Walking speed in meters per second
+        time_attr: str
+            Edge attribute for the walking time in seconds
+        length_attr: str
+            Edge attribute for the length in meters
+        attr: dict
+            Attributes shared by all of the edges
+        """
+        if not self.metric:
+            raise ValueError("Walking edges require a metric CloseEdgeSweep")
+        i, j, distance = self.pairs(max_distance)
+        length = np.round(distance, 2).tolist()
+        walk_time = np.round(distance / walking_speed, 2).tolist()
+        nodes = self.nodes
+        edges = []
+        for u, v, d, t in zip(i.tolist(), j.tolist(), length, walk_time):
+            data = {**attr, length_attr: d, time_attr: t}
+            edges.append((nodes[u], nodes[v], data))
+            edges.append((nodes[v], nodes[u], data.copy()))
+        return edges
+
+    def with_walking_edges(
+        self, G: GGraph, max_distance: float, walking_speed=WALKING_SPEED, **kwargs
+    ) -> GGraph:
+        """Copy of a graph with walking edges (in both directions) below `max_distance`
+        meters. Edges that already exist (e.g., bus trips) are left as they are. See
+        `walking_edges` for the parameters."""
+        G_ = G.__class__(G)
+        G_.add_edges_from(
+            [
+                (u, v, data)
+                for u, v, data in self.walking_edges(
+                    max_distance, walking_speed=walking_speed, **kwargs
+                )
+                if not G.has_edge(u, v)
+            ]
         )
-    return close_edges
+        return G_  # type: ignore
+
 
+def get_close_edges(pos: Union[PosDict, AttributeStore], max_distance=0.001):
+    """Get the set of (u, v) node pairs closer than `max_distance` to each other."""
+    nodes, coords = pos_to_array(pos)
+    i, j, _ = close_pairs(coords, max_distance)
+    return {(nodes[u], nodes[v]) for u, v in zip(i.tolist(), j.tolist())}
 
-def with_close_edges(G: GGraph, max_distance, num_partitions=50, **kwargs) -> GGraph:
-    G_ = G.__class__(G)
-    close_edges = get_close_edges(
-        nx.get_node_attributes(G, "pos"), max_distance, num_partitions
+
+def with_close_edges(G: GGraph, max_distance, **kwargs) -> GGraph:
+    """Copy of a graph with edges (in both directions) between nodes closer than
+    `max_distance`.
+
+    To compare several thresholds, use a single `CloseEdgeSweep` instead.
+    """
+    return CloseEdgeSweep.from_graph(G, max_distance).with_close_edges(
+        G, max_distance, **kwargs
     )
-    G_.add_edges_from(
-        ebunch_to_add=(close_edges | {(v, u) for u, v in close_edges}), **kwargs
+
+
+def with_walking_edges(
+    G: GGraph, max_distance, walking_speed=WALKING_SPEED, **kwargs
+) -> GGraph:
+    """Copy of a graph with walking edges between stops closer than `max_distance`
+    meters.
+
+    Node positions are (lon, lat) in degrees. Each edge gets its length in meters and
+    its walking time in seconds (see `CloseEdgeSweep.walking_edges`). Edges that already
+    exist (e.g., bus trips) are left as they are.
+    """
+    return CloseEdgeSweep.from_graph(G, max_distance, metric=True).with_walking_edges(
+        G, max_distance, walking_speed=walking_speed, **kwargs
     )
-    # I don't know why mypy hates this
-    return G_  # type: ignore
+
+
+class CloseEdgeChanges(NamedTuple):
+    """Directed close edges added to, removed from and updated in a graph by a
+    `CloseEdgeIndex`. Updated edges are kept, but their data (e.g., length) changed."""
+
+    added: list[tuple[Node, Node]]
+    removed: list[tuple[Node, Node]]
+    updated: list[tuple[Node, Node]]
+
+
+class CloseEdgeIndex:
+    """Hash grid of node positions that keeps a graph's close edges up to date in place.
+
+    The grid cells are `max_distance` wide, so the close neighbors of a node are in the
+    3x3 block of cells around it and inserting, moving or removing a node only touches
+    those cells. Only the close edges added by the index are ever removed by it; edges
+    that already existed in the graph (e.g., bus trips) are left alone.
+
+    Parameters
+    ----------
+    G: nx.Graph | nx.DiGraph
+        Graph to maintain. Its close edges are added in place.
+    max_distance: float
+        In meters if `metric`, else in the units of the `pos` attribute
+    metric: bool
+        True if positions are (lon, lat) in degrees. Close edges are then walking edges
+        with a length and walking time (see `CloseEdgeSweep.walking_edges`).
+    walking_speed: float
+        Walking speed in meters per second, if `metric`
+    attr: dict
+        Attributes shared by all of the close edges
+    """
+
+    def __init__(
+        self,
+        G: Graph,
+        max_distance: float,
+        metric=False,
+        walking_speed=WALKING_SPEED,
+        **attr,
+    ):
+        self.G = G
+        self.max_distance = max_distance
+        self.metric = metric
+        self.walking_speed = walking_speed
+        self.attr = attr
+
+        nodes, coords = pos_to_array(nx.get_node_attributes(G, "pos"))
+        self.ref_lat = float(coords[:, 1].mean()) if metric and len(coords) else 0.0
+
+        self._xy: dict[Node, tuple[float, float]] = {}
+        self._cells: dict[tuple[int, int], set[Node]] = defaultdict(set)
+        self._neighbors: dict[Node, set[Node]] = {}
+        self._managed: set[tuple[Node, Node]] = set()
+
+        xy = self._project(coords)
+        for node, (x, y) in zip(nodes, xy.tolist()):
+            self._xy[node] = (x, y)
+            self._cells[self._cell(x, y)].add(node)
+            self._neighbors[node] = set()
+
+        # Bulk-load the initial close edges with a single pair search
+        i, j, distance = close_pairs(xy, max_distance)
+        for u, v, d in zip(i.tolist(), j.tolist(), distance.tolist()):
+            self._link(nodes[u], nodes[v], d, CloseEdgeChanges([], [], []))
+
+    def _project(self, coords: NDArray[np.floating]) -> NDArray[np.floating]:
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        return project_lonlat(coords, self.ref_lat) if self.metric else coords
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return (int(x // self.max_distance), int(y // self.max_distance))
+
+    def _nearby(self, node: Node) -> dict[Node, float]:
+        """Nodes closer than max_distance to a node and their distance"""
+        x, y = self._xy[node]
+        cx, cy = self._cell(x, y)
+        nearby = {}
+        for i, j in itertools.product((cx - 1, cx, cx + 1), (cy - 1, cy, cy + 1)):
+            for other in self._cells.get((i, j), ()):
+                if other == node:
+                    continue
+                ox, oy = self._xy[other]
+                d = math.hypot(x - ox, y - oy)
+                if d < self.max_distance:
+                    nearby[other] = d
+        return nearby
+
+    def _edge_data(self, distance: float) -> dict:
+        if not self.metric:
+            return dict(self.attr)
+        return {
+            **self.attr,
+            "length": round(distance, 2),
+            "avg_trip_time": round(distance / self.walking_speed, 2),
+        }
+
+    def _link(self, u: Node, v: Node, distance: float, changes: CloseEdgeChanges):
+        self._neighbors[u].add(v)
+        self._neighbors[v].add(u)
+        for a, b in ((u, v), (v, u)):
+            if not self.G.has_edge(a, b):
+                self.G.add_edge(a, b, **self._edge_data(distance))
+                self._managed.add((a, b))
+                changes.added.append((a, b))
+
+    def _relink(self, u: Node, v: Node, distance: float, changes: CloseEdgeChanges):
+        """Refresh the data of the close edges between two nodes that are still close"""
+        data = self._edge_data(distance)
+        for a, b in ((u, v), (v, u)):
+            if (a, b) not in self._managed:
+                continue
+            old = self.G[a][b]
+            if any(old.get(k) != value for k, value in data.items()):
+                self.G.add_edge(a, b, **data)
+                changes.updated.append((a, b))
+
+    def _unlink(self, u: Node, v: Node, changes: CloseEdgeChanges):
+        self._neighbors[u].discard(v)
+        self._neighbors[v].discard(u)
+        for a, b in ((u, v), (v, u)):
+            if (a, b) in self._managed:
+                self._managed.remove((a, b))
+                if self.G.has_edge(a, b):
+                    self.G.remove_edge(a, b)
+                changes.removed.append((a, b))
+
+    def _place(self, node: Node, pos: ArrayLike, changes: CloseEdgeChanges):
+        """Put a node (already removed from the grid, if present) at a position"""
+        x, y = self._project(np.asarray(pos))[0].tolist()
+        self._xy[node] = (x, y)
+        self._cells[self._cell(x, y)].add(node)
+        self._neighbors.setdefault(node, set())
+
+        nearby = self._nearby(node)
+        for other in self._neighbors[node] - nearby.keys():
+            self._unlink(node, other, changes)
+        for other, d in nearby.items():
+            if other not in self._neighbors[node]:
+                self._link(node, other, d, changes)
+            else:
+                self._relink(node, other, d, changes)
+
+    def _unplace(self, node: Node):
+        cell = self._cell(*self._xy[node])
+        self._cells[cell].discard(node)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    @property
+    def close_edges(self) -> set[tuple[Node, Node]]:
+        """Directed close edges that were added to the graph by the index"""
+        return set(self._managed)
+
+    def insert(self, node: Node, pos: ArrayLike, **attr) -> CloseEdgeChanges:
+        """Add a node at a position (or move it, if it exists) and link its close edges"""
+        if node in self._xy:
+            return self.move(node, pos)
+        changes = CloseEdgeChanges([], [], [])
+        self.G.add_node(node, pos=pos, **attr)
+        self._place(node, pos, changes)
+        return changes
+
+    def move(self, node: Node, pos: ArrayLike) -> CloseEdgeChanges:
+        """Move a node to a new position and update its close edges, including the
+        length and walking time of the ones it keeps"""
+        changes = CloseEdgeChanges([], [], [])
+        self._unplace(node)
+        self.G.nodes[node]["pos"] = pos
+        self._place(node, pos, changes)
+        return changes
+
+    def remove(self, node: Node, remove_node=True) -> CloseEdgeChanges:
+        """Remove a node's close edges, and the node itself if `remove_node`"""
+        changes = CloseEdgeChanges([], [], [])
+        for other in list(self._neighbors[node]):
+            self._unlink(node, other, changes)
+        self._unplace(node)
+        del self._xy[node]
+        del self._neighbors[node]
+        if remove_node:
+            self.G.remove_node(node)
+        return changes
+
+    def update(
+        self,
+        insert: Optional[dict[Node, ArrayLike]] = None,
+        move: Optional[dict[Node, ArrayLike]] = None,
+        remove: Iterable[Node] = (),
+    ) -> CloseEdgeChanges:
+        """Apply a batch of changes, e.g. between two feed versions.
+
+        Returns the net close edges added, removed and updated.
+        """
+        added: dict[tuple[Node, Node], None] = {}
+        removed: dict[tuple[Node, Node], None] = {}
+        updated: dict[tuple[Node, Node], None] = {}
+
+        def merge(changes: CloseEdgeChanges):
+            # An edge added then removed within the batch cancels out, and one removed
+            # then added again is kept with (possibly) new data
+            for e in changes.removed:
+                updated.pop(e, None)
+                if e in added:
+                    del added[e]
+                else:
+                    removed[e] = None
+            for e in changes.added:
+                if e in removed:
+                    del removed[e]
+                    updated[e] = None
+                else:
+                    added[e] = None
+            for e in changes.updated:
+                if e not in added:
+                    updated[e] = None
+
+        for node in remove:
+            merge(self.remove(node))
+        for node, pos in (move or {}).items():
+            merge(self.move(node, pos))
+        for node, pos in (insert or {}).items():
+            merge(self.insert(node, pos))
+
+        return CloseEdgeChanges(list(added), list(removed), list(updated))
@@ -0,0 +1,269 @@
+from typing import Literal, Optional
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from numpy.typing import NDArray
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from dcns.graph_utils import BBox, Graph, Node
+
+
+class CompiledGraph:
+    """Integer-indexed array representation of a networkx graph.
+
+    Each node is assigned an index in `[0, N)` and each edge an index in `[0, E)`.
+    Undirected edges are stored once; `csr()` mirrors them when building the adjacency.
+
+    Attributes
+    ----------
+    nodes: list of Nodes
+        Node objects in index order
+    node_index: dict of Node -> int
+    src: int array of shape (E,)
+        Source node index of each edge
+    dst: int array of shape (E,)
+        Target node index of each edge
+    weight: float array of shape (E,)
+    directed: bool
+    coords: float array of shape (N, 2) (optional)
+        Node positions, if every node has one
+    """
+
+    def __init__(
+        self,
+        nodes: list[Node],
+        src: NDArray[np.intp],
+        dst: NDArray[np.intp],
+        weight: NDArray[np.floating],
+        directed: bool = True,
+        coords: Optional[NDArray[np.floating]] = None,
+    ):
+        self.nodes = nodes
+        self.node_index = {node: i for i, node in enumerate(nodes)}
+        self.src = src
+        self.dst = dst
+        self.weight = weight
+        self.directed = directed
+        self.coords = coords
+        self._tree: Optional[cKDTree] = None
+        self._edge_index: Optional[dict[tuple[Node, Node], int]] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.src)
+
+    @property
+    def tree(self) -> cKDTree:
+        """KD-tree over the node coordinates, built on first use"""
+        if self._tree is None:
+            if self.coords is None:
+                raise ValueError("Graph was compiled without node positions")
+            self._tree = cKDTree(self.coords)
+        return self._tree
+
+    @property
+    def edge_index(self) -> dict[tuple[Node, Node], int]:
+        """Dictionary of (u, v) -> edge index, built on first use"""
+        if self._edge_index is None:
+            nodes = self.nodes
+            pairs = zip(self.src.tolist(), self.dst.tolist())
+            self._edge_index = {
+                (nodes[u], nodes[v]): e for e, (u, v) in enumerate(pairs)
+            }
+            if not self.directed:
+                self._edge_index.update(
+                    {(v, u): e for (u, v), e in self._edge_index.items()}
+                )
+        return self._edge_index
+
+    def indices(self, nodes) -> NDArray[np.intp]:
+        """Convert an iterable of nodes to an array of node indices"""
+        return np.fromiter((self.node_index[n] for n in nodes), dtype=np.intp)
+
+    def csr(
+        self,
+        edge_mask: Optional[NDArray[np.bool_]] = None,
+        weight: Optional[NDArray[np.floating]] = None,
+    ) -> sp.csr_array:
+        """Weighted (N, N) adjacency matrix of the graph, or of the edges in `edge_mask`.
+
+        `A[u, v]` is the weight of edge u->v.
+        """
+        src, dst = self.src, self.dst
+        data = self.weight if weight is None else weight
+        if edge_mask is not None:
+            src, dst, data = src[edge_mask], dst[edge_mask], data[edge_mask]
+        if not self.directed:
+            src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+            data = np.concatenate((data, data))
+        N = self.num_nodes
+        return sp.csr_array((data, (src, dst)), shape=(N, N))
+
+    def bbox_indices(self, bbox: BBox) -> NDArray[np.intp]:
+        """Indices of the nodes inside a bounding box `[[xmin, xmax], [ymin, ymax]]`.
+
+        Only visits the nodes in the square around the box, not the whole graph.
+        """
+        bbox = np.asarray(bbox, dtype=float)
+        center = bbox.mean(axis=1)
+        half_size = (bbox[:, 1] - bbox[:, 0]).max() / 2
+        candidates = np.asarray(
+            self.tree.query_ball_point(center, half_size, p=np.inf), dtype=np.intp
+        )
+        xy = self.coords[candidates]  # type: ignore
+        inside = np.all((xy >= bbox[:, 0]) & (xy <= bbox[:, 1]), axis=1)
+        return np.sort(candidates[inside])
+
+    def view(self) -> "GraphView":
+        """View of the whole graph"""
+        return GraphView(self)
+
+    def crop(self, bbox: BBox) -> "GraphView":
+        """View of the nodes inside a bounding box and the edges between them"""
+        return self.view().crop(bbox)
+
+
+class GraphView:
+    """Subgraph of a `CompiledGraph` given by a node mask and an edge mask.
+
+    Views share the compiled graph's arrays; each one only stores its two masks. Edges
+    are only in the view if both of their endpoints are.
+
+    Attributes
+    ----------
+    graph: CompiledGraph
+    node_mask: bool array of shape (N,)
+    edge_mask: bool array of shape (E,)
+    """
+
+    def __init__(
+        self,
+        graph: CompiledGraph,
+        node_mask: Optional[NDArray[np.bool_]] = None,
+        edge_mask: Optional[NDArray[np.bool_]] = None,
+    ):
+        self.graph = graph
+        self.node_mask = (
+            np.ones(graph.num_nodes, dtype=bool) if node_mask is None else node_mask
+        )
+        edges_inside = self.node_mask[graph.src] & self.node_mask[graph.dst]
+        self.edge_mask = edges_inside if edge_mask is None else edge_mask & edges_inside
+
+    @property
+    def num_nodes(self) -> int:
+        return int(np.count_nonzero(self.node_mask))
+
+    @property
+    def num_edges(self) -> int:
+        return int(np.count_nonzero(self.edge_mask))
+
+    @property
+    def directed(self) -> bool:
+        return self.graph.directed
+
+    def node_indices(self) -> NDArray[np.intp]:
+        return np.flatnonzero(self.node_mask)
+
+    def edge_indices(self) -> NDArray[np.intp]:
+        return np.flatnonzero(self.edge_mask)
+
+    def nodes(self) -> list[Node]:
+        nodes = self.graph.nodes
+        return [nodes[i] for i in self.node_indices().tolist()]
+
+    def edges(self) -> list[tuple[Node, Node]]:
+        nodes = self.graph.nodes
+        e = self.edge_indices()
+        pairs = zip(self.graph.src[e].tolist(), self.graph.dst[e].tolist())
+        return [(nodes[u], nodes[v]) for u, v in pairs]
+
+    def csr(self) -> sp.csr_array:
+        """Weighted (N, N) adjacency matrix of the view, indexed like the full graph"""
+        return self.graph.csr(self.edge_mask)
+
+    def subview(
+        self,
+        node_mask: Optional[NDArray[np.bool_]] = None,
+        edge_mask: Optional[NDArray[np.bool_]] = None,
+    ) -> "GraphView":
+        """View of the nodes and edges in both this view and the given masks"""
+        return GraphView(
+            self.graph,
+            self.node_mask if node_mask is None else self.node_mask & node_mask,
+            self.edge_mask if edge_mask is None else self.edge_mask & edge_mask,
+        )
+
+    def crop(self, bbox: BBox) -> "GraphView":
+        """View of the nodes inside a bounding box and the edges between them"""
+        mask = np.zeros(self.graph.num_nodes, dtype=bool)
+        mask[self.graph.bbox_indices(bbox)] = True
+        return self.subview(node_mask=mask)
+
+    def largest_component(
+        self, connection: Literal["weak", "strong"] = "strong"
+    ) -> "GraphView":
+        """View of the largest connected component"""
+        _, labels = connected_components(
+            self.csr(), directed=self.directed, connection=connection
+        )
+        # Only count the labels of nodes in the view; the rest are isolated nodes
+        sizes = np.bincount(labels[self.node_mask])
+        return self.subview(node_mask=labels == np.argmax(sizes))
+
+    def to_networkx(self, G: Graph) -> Graph:
+        """Read-only networkx view of the original graph `G` restricted to this view.
+
+        Nothing is copied, so the result can be passed to the pathfinding and plotting
+        functions.
+        """
+        node_index, node_mask = self.graph.node_index, self.node_mask
+        edge_index, edge_mask = self.graph.edge_index, self.edge_mask
+        return nx.subgraph_view(
+            G,
+            filter_node=lambda n: bool(node_mask[node_index[n]]),
+            filter_edge=lambda u, v: bool(edge_mask[edge_index[u, v]]),
+        )
+
+
+def compile_graph(G: Graph, weight: Optional[str] = "weight", default=1.0, pos="pos"):
+    """Compile a networkx graph into a `CompiledGraph`.
+
+    Parameters
+    ----------
+    G: nx.Graph | nx.DiGraph
+    weight: str (optional)
+        Edge attribute to use as the weight. If None, every edge has weight `default`.
+    default: float
+        Weight of edges without the `weight` attribute
+    pos: str (optional)
+        Node attribute with the node positions. Positions are only kept if every node
+        has one.
+    """
+    nodes = list(G.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+
+    num_edges = G.number_of_edges()
+    src = np.empty(num_edges, dtype=np.intp)
+    dst = np.empty(num_edges, dtype=np.intp)
+    weights = np.full(num_edges, default, dtype=float)
+    for i, (u, v, w) in enumerate(G.edges(data=weight, default=default)):
+        src[i] = node_index[u]
+        dst[i] = node_index[v]
+        if weight is not None:
+            weights[i] = w
+
+    coords = None
+    if pos is not None:
+        node_pos = nx.get_node_attributes(G, pos)
+        if len(node_pos) == len(nodes) and nodes:
+            coords = np.array([node_pos[n] for n in nodes], dtype=float).reshape(-1, 2)
+
+    return CompiledGraph(
+        nodes, src, dst, weights, directed=G.is_directed(), coords=coords
+    )
@@ -0,0 +1,157 @@
+"""Exact eccentricities, diameter and radius with few searches (Takes-Kosters bounds).
+
+Each search from a node v gives its eccentricity e(v) and bounds for every other node w
+by the triangle inequality:
+
+    max(d(w, v), e(v) - d(v, w)) <= e(w) <= d(w, v) + e(v)
+
+Nodes are resolved once their bounds meet, so on sparse spatial graphs only a small
+fraction of the nodes need a full search.
+"""
+
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from dcns.compiled_graph import CompiledGraph, GraphView, compile_graph
+from dcns.graph_utils import Graph, Node
+
+
+class Eccentricity(NamedTuple):
+    """(Out-)eccentricity bounds of each node, and the extremes of the graph"""
+
+    nodes: list[Node]
+    lower: NDArray[np.floating]
+    """Lower bound of each node's eccentricity (equal to `upper` once resolved)"""
+    upper: NDArray[np.floating]
+    """Upper bound of each node's eccentricity"""
+    diameter: float
+    radius: float
+    center: list[Node]
+    """Nodes whose eccentricity equals the radius"""
+    periphery: list[Node]
+    """Nodes whose eccentricity equals the diameter"""
+    num_searches: int
+    """Number of nodes searched from"""
+
+    def eccentricity(self) -> dict[Node, float]:
+        """Eccentricity of each resolved node"""
+        exact = np.flatnonzero(self.lower == self.upper)
+        return {self.nodes[i]: float(self.upper[i]) for i in exact.tolist()}
+
+
+def eccentricity_bounds(
+    graph: Union[CompiledGraph, GraphView],
+    unweighted=False,
+    exact=False,
+    max_searches: Optional[int] = None,
+) -> Eccentricity:
+    """Eccentricities of a (strongly) connected graph by bounding (Takes-Kosters).
+
+    The next node to search alternates between the node with the largest upper bound
+    and the node with the smallest lower bound, preferring high-degree nodes on ties.
+    For directed graphs, each search runs forward and backward from the node.
+
+    Parameters
+    ----------
+    graph: CompiledGraph | GraphView
+        Must be strongly connected, such as `cg.view().largest_component()`
+    unweighted: bool
+        Measure distance in hops instead of edge weight
+    exact: bool
+        Resolve the eccentricity of every node. By default, only search until the
+        diameter, radius, center and periphery are known, which needs far fewer
+        searches on long, sparse graphs like a transit network.
+    max_searches: int (optional)
+        Stop after this many searches. The diameter and radius are then only bounds
+        (the diameter a lower bound and the radius an upper bound).
+    """
+    view = graph.view() if isinstance(graph, CompiledGraph) else graph
+    index = view.node_indices()
+    A = view.csr()[index][:, index]
+    directed = view.directed
+    nodes = view.nodes()
+    N = len(nodes)
+    if N == 0:
+        raise ValueError("Graph has no nodes")
+    num_components, _ = connected_components(A, directed=directed, connection="strong")
+    if num_components > 1:
+        raise ValueError("Eccentricity is only defined for strongly connected graphs")
+
+    AT = A.T.tocsr() if directed else A
+    degree = np.diff(A.indptr) + (np.diff(AT.indptr) if directed else 0)
+    lower = np.full(N, -np.inf)
+    upper = np.full(N, np.inf)
+    candidates = np.ones(N, dtype=bool)
+
+    num_searches = 0
+    pick_upper = True
+    while candidates.any() and (max_searches is None or num_searches < max_searches):
+        # Alternate between the largest upper and smallest lower bound, breaking
+        # ties by degree (the first search is from the highest-degree node)
+        c = np.flatnonzero(candidates)
+        if pick_upper:
+            v = c[np.lexsort((degree[c], upper[c]))[-1]]
+        else:
+            v = c[np.lexsort((degree[c], -lower[c]))[-1]]
+        pick_upper = not pick_upper
+
+        d_out = dijkstra(A, directed=directed, indices=v, unweighted=unweighted)
+        d_in = (
+            dijkstra(AT, directed=True, indices=v, unweighted=unweighted)
+            if directed
+            else d_out
+        )
+        num_searches += 1
+        e = d_out.max()
+        lower = np.maximum(lower, np.maximum(d_in, e - d_out))
+        upper = np.minimum(upper, d_in + e)
+        lower[v] = upper[v] = e
+
+        # Bounds of weighted graphs may differ by rounding when they meet
+        tolerance = 1e-9 * max(e, 1)
+        resolved = upper - lower <= tolerance
+        upper[resolved] = lower[resolved]
+        candidates &= ~resolved
+        if not exact:
+            # Nodes that can't be in the periphery or center don't need resolving
+            candidates &= (upper >= lower.max() - tolerance) | (
+                lower <= upper.min() + tolerance
+            )
+
+    diameter = float(lower.max())
+    radius = float(upper.min())
+    resolved = lower == upper
+    return Eccentricity(
+        nodes,
+        lower,
+        upper,
+        diameter,
+        radius,
+        [nodes[i] for i in np.flatnonzero(resolved & (upper == radius))],
+        [nodes[i] for i in np.flatnonzero(resolved & (lower == diameter))],
+        num_searches,
+    )
+
+
+def graph_eccentricity(
+    G: Graph, weight: Optional[str] = None, exact=False, max_searches=None
+) -> Eccentricity:
+    """Eccentricities of a networkx graph. See `eccentricity_bounds`.
+
+    Parameters
+    ----------
+    G: nx.Graph | nx.DiGraph
+        Must be strongly connected
+    weight: str (optional)
+        Edge attribute to measure distance with, such as "avg_trip_time". If None,
+        distance is measured in hops.
+    """
+    return eccentricity_bounds(
+        compile_graph(G, weight=weight, pos=None),
+        unweighted=weight is None,
+        exact=exact,
+        max_searches=max_searches,
+    )
@@ -1,8 +1,8 @@
-import itertools
-from typing import Any, Iterable, TypeVar, Union
+from typing import Any, Iterable, Optional, TypeVar, Union
 
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 from numpy.typing import NDArray
 
 Node = Any
@@ -15,62 +15,294 @@ GGraph = TypeVar("GGraph", bound=Graph)
 
 def remove_edge_attrs(G: GGraph, attrs: Union[Iterable[str], str]) -> GGraph:
     """Remove edge attributes from a graph"""
-    for n1, n2, d in G.edges(data=True):
-        if isinstance(attrs, str):
-            d.pop(attrs)
+    attrs = (attrs,) if isinstance(attrs, str) else tuple(attrs)
+    for _, _, d in G.edges(data=True):
         for attr in attrs:
             d.pop(attr, None)
     return G
 
 
 def node_attr_list_to_ndarray(G: Graph, attr: str):
-    """Convert node attributes of a graph from a list to a numpy array"""
+    """Convert node attributes of a graph from a list to a numpy array
+
+    The arrays are rows of a single contiguous array.
+    """
+    values = nx.get_node_attributes(G, attr)
     nx.set_node_attributes(
-        G,
-        {node: np.array(pos) for node, pos in nx.get_node_attributes(G, attr).items()},
-        attr,
+        G, dict(zip(values.keys(), np.array(list(values.values())))), attr
     )
 
 
 def node_attr_ndarray_to_list(G: Graph, attr: str):
     """Convert node attributes of a graph from a numpy array to a list"""
+    values = nx.get_node_attributes(G, attr)
     nx.set_node_attributes(
-        G,
-        {node: pos.tolist() for node, pos in nx.get_node_attributes(G, attr).items()},
-        attr,
+        G, dict(zip(values.keys(), np.array(list(values.values())).tolist())), attr
     )
 
 
-def bibliographic_coupling(G: nx.DiGraph) -> nx.Graph:
-    B = nx.Graph()
-    B.add_nodes_from(G.nodes())
+def _column(values: list) -> NDArray:
+    """Convert a list of attribute values to a typed column.
+
+    Numeric columns with missing (None) values become float columns with NaN; anything
+    else, including sequences of different lengths, becomes an object column.
+    """
+    if all(v is not None for v in values):
+        try:
+            column = np.asarray(values)
+        except ValueError:
+            # Ragged sequences, such as lists of trip times of different lengths
+            column = None
+        if column is not None and column.ndim == 1 and column.dtype.kind in "biuf":
+            return column
+    if all(v is None or isinstance(v, (int, float, np.number)) for v in values):
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _is_missing(column: NDArray) -> NDArray[np.bool_]:
+    if column.dtype.kind == "f":
+        return np.isnan(column)
+    if column.dtype == object:
+        return np.fromiter((v is None for v in column), dtype=bool, count=len(column))
+    return np.zeros(len(column), dtype=bool)
+
+
+class AttributeStore:
+    """Node and edge attributes as typed columns aligned to integer node/edge indices.
+
+    Node positions are kept in a single contiguous (N, 2) array, so numeric code can
+    use every coordinate at once instead of looping over a `PosDict`.
+
+    Attributes
+    ----------
+    nodes: list of Nodes
+        Node objects in index order
+    node_index: dict of Node -> int
+    coords: float array of shape (N, 2)
+        Node positions, NaN where a node has none
+    src, dst: int arrays of shape (E,)
+        Node indices of each edge
+    node_columns: dict of str -> array of shape (N,)
+    edge_columns: dict of str -> array of shape (E,)
+    """
+
+    def __init__(
+        self,
+        nodes: list[Node],
+        coords: Optional[NDArray[np.floating]] = None,
+        src: Optional[NDArray[np.intp]] = None,
+        dst: Optional[NDArray[np.intp]] = None,
+        node_columns: Optional[dict[str, NDArray]] = None,
+        edge_columns: Optional[dict[str, NDArray]] = None,
+    ):
+        self.nodes = nodes
+        self.node_index = {node: i for i, node in enumerate(nodes)}
+        self.coords = (
+            np.full((len(nodes), 2), np.nan)
+            if coords is None
+            else np.ascontiguousarray(coords, dtype=float)
+        )
+        self.src = np.empty(0, dtype=np.intp) if src is None else src
+        self.dst = np.empty(0, dtype=np.intp) if dst is None else dst
+        self.node_columns = node_columns or {}
+        self.edge_columns = edge_columns or {}
+
+    @classmethod
+    def from_graph(cls, G: Graph, pos="pos"):
+        """Read every node and edge attribute of a graph into columns.
+
+        The `pos` node attribute becomes the coordinate array.
+        """
+        nodes = list(G.nodes())
+        node_index = {node: i for i, node in enumerate(nodes)}
+
+        node_data = [d for _, d in G.nodes(data=True)]
+        coords = np.array(
+            [d.get(pos, (np.nan, np.nan)) for d in node_data], dtype=float
+        ).reshape(-1, 2)
+        node_names = set().union(*node_data) - {pos}
+        node_columns = {
+            name: _column([d.get(name) for d in node_data]) for name in node_names
+        }
+
+        edges = list(G.edges(data=True))
+        src = np.fromiter((node_index[u] for u, _, _ in edges), np.intp, len(edges))
+        dst = np.fromiter((node_index[v] for _, v, _ in edges), np.intp, len(edges))
+        edge_names = set().union(*(d for _, _, d in edges))
+        edge_columns = {
+            name: _column([d.get(name) for _, _, d in edges]) for name in edge_names
+        }
 
-    for ni, nj in itertools.permutations(G.nodes, 2):
-        weight = sum(
-            G[ni][nk]["weight"] * G[nj][nk]["weight"]
-            for nk in (set(G.successors(ni)) & set(G.successors(nj)))
+        return cls(nodes, coords, src, dst, node_columns, edge_columns)
+
+    @classmethod
+    def from_stops(cls, stops):
+        """Node attributes from a GTFS `stops.txt` DataFrame, indexed by `stop_id`"""
+        return cls(
+            stops["stop_id"].tolist(),
+            coords=stops[["stop_lon", "stop_lat"]].to_numpy(dtype=float),
+            node_columns={
+                "name": stops["stop_name"].to_numpy(dtype=object),
+                "lon": stops["stop_lon"].to_numpy(dtype=float),
+                "lat": stops["stop_lat"].to_numpy(dtype=float),
+            },
         )
 
-        if weight != 0:
-            B.add_edge(nj, ni, weight=weight)
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.src)
+
+    def edges(self) -> list[tuple[Node, Node]]:
+        nodes = self.nodes
+        return [
+            (nodes[u], nodes[v]) for u, v in zip(self.src.tolist(), self.dst.tolist())
+        ]
+
+    def pos(self) -> PosDict:
+        """Node positions in the networkx format. Each one is a row of `coords`."""
+        return dict(zip(self.nodes, self.coords))
 
-    return B
+    def node_attr(self, name: str) -> dict[Node, Any]:
+        """Node attribute as a dictionary, like `nx.get_node_attributes`"""
+        column = self.node_columns[name]
+        present = np.flatnonzero(~_is_missing(column))
+        nodes = self.nodes
+        return {nodes[i]: v for i, v in zip(present.tolist(), column[present].tolist())}
 
+    def edge_attr(self, name: str) -> dict[tuple[Node, Node], Any]:
+        """Edge attribute as a dictionary, like `nx.get_edge_attributes`"""
+        column = self.edge_columns[name]
+        present = np.flatnonzero(~_is_missing(column))
+        nodes, src, dst = self.nodes, self.src[present], self.dst[present]
+        return {
+            (nodes[u], nodes[v]): value
+            for u, v, value in zip(src.tolist(), dst.tolist(), column[present].tolist())
+        }
 
-def cocitation(G: nx.DiGraph) -> nx.Graph:
-    C = nx.Graph()
-    C.add_nodes_from(G.nodes())
+    def set_attributes(self, G: Graph, pos: Optional[str] = "pos"):
+        """Write the node and edge columns (and positions as `pos`) to a graph"""
+        for name in self.node_columns:
+            nx.set_node_attributes(G, self.node_attr(name), name)
+        for name in self.edge_columns:
+            nx.set_edge_attributes(G, self.edge_attr(name), name)
+        if pos is not None:
+            nx.set_node_attributes(G, self.pos(), pos)
 
-    for ni, nj in itertools.permutations(G.nodes, 2):
-        weight = sum(
-            G[nk][ni]["weight"] * G[nk][nj]["weight"]
-            for nk in (set(G.predecessors(ni)) & set(G.predecessors(nj)))
+
+def pos_to_array(
+    pos: Union[PosDict, AttributeStore],
+) -> tuple[list[Node], NDArray[np.floating]]:
+    """Split node positions into a list of nodes and an (N, 2) coordinate array.
+
+    An `AttributeStore` already has both, so nothing is copied.
+    """
+    if isinstance(pos, AttributeStore):
+        return pos.nodes, pos.coords
+    nodes = list(pos.keys())
+    return nodes, np.array(list(pos.values()), dtype=float).reshape(-1, 2)
+
+
+def _sparse_coupling(
+    C: Union[sp.spmatrix, sp.csr_array],
+    nodes: list[Node],
+    threshold: Optional[float],
+    top_k: Optional[int],
+    as_graph: bool,
+):
+    """Remove self-coupling, threshold, prune and format a coupling matrix"""
+    C = sp.csr_array(C)
+    C.setdiag(0)
+    if threshold is not None:
+        C.data[C.data < threshold] = 0
+    C.eliminate_zeros()
+
+    if top_k is not None:
+        C = _top_k_per_row(C, top_k)
+        # Keep an entry if it is in the top k of either node to keep C symmetric
+        C = C.maximum(C.T).tocsr()
+
+    if not as_graph:
+        return C
+
+    coo = sp.triu(C, k=1).tocoo()
+    G = nx.Graph()
+    G.add_nodes_from(nodes)
+    G.add_weighted_edges_from(
+        zip(
+            (nodes[i] for i in coo.row.tolist()),
+            (nodes[j] for j in coo.col.tolist()),
+            coo.data.tolist(),
         )
+    )
+    return G
 
-        if weight != 0:
-            C.add_edge(nj, ni, weight=weight)
 
-    return C
+def _top_k_per_row(C: sp.csr_array, k: int) -> sp.csr_array:
+    """Keep only the k largest entries of each row of a CSR matrix"""
+    counts = np.diff(C.indptr)
+    row = np.repeat(np.arange(C.shape[0]), counts)
+    # Sort by row, then by descending value, and take the first k of each row
+    order = np.lexsort((-C.data, row))
+    rank = np.arange(len(order)) - np.repeat(C.indptr[:-1], counts)
+    keep = order[rank < k]
+    return sp.csr_array((C.data[keep], (row[keep], C.indices[keep])), shape=C.shape)
+
+
+def bibliographic_coupling(
+    G: nx.DiGraph,
+    weight: Optional[str] = "weight",
+    threshold: Optional[float] = None,
+    top_k: Optional[int] = None,
+    as_graph=True,
+):
+    """Bibliographic coupling of a directed graph, B = A·Aᵀ.
+
+    The coupling of nodes i and j is the sum of w(i, k)·w(j, k) over their common
+    successors k.
+
+    Parameters
+    ----------
+    G: nx.DiGraph
+    weight: str (optional)
+        Edge attribute to use as the weight. If None, every edge has weight 1.
+    threshold: float (optional)
+        Drop couplings below this value
+    top_k: int (optional)
+        Only keep the k strongest couplings of each node
+    as_graph: bool
+        Return an `nx.Graph` if True, else a sparse matrix in the order of `G.nodes`
+
+    Returns
+    -------
+    nx.Graph | scipy.sparse.csr_array
+    """
+    nodes = list(G.nodes())
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight, format="csr")
+    return _sparse_coupling(A @ A.T, nodes, threshold, top_k, as_graph)
+
+
+def cocitation(
+    G: nx.DiGraph,
+    weight: Optional[str] = "weight",
+    threshold: Optional[float] = None,
+    top_k: Optional[int] = None,
+    as_graph=True,
+):
+    """Cocitation of a directed graph, C = Aᵀ·A.
+
+    The cocitation of nodes i and j is the sum of w(k, i)·w(k, j) over their common
+    predecessors k. See `bibliographic_coupling` for the parameters.
+    """
+    nodes = list(G.nodes())
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight, format="csc")
+    return _sparse_coupling(A.T @ A, nodes, threshold, top_k, as_graph)
 
 
 BBox = Union[
@@ -86,6 +318,13 @@ def in_bbox(point, bbox: BBox) -> bool:
 
 
 def crop_graph(G: Graph, node_pos: PosDict, bbox: BBox):
-    """Get a subgraph based on node positions inside a bounding box"""
-    nodes_inside = [node for node in G.nodes() if in_bbox(node_pos[node], bbox)]
-    return G.__class__(G.subgraph(nodes_inside))
+    """Get a subgraph based on node positions inside a bounding box.
+
+    The result is a new graph that can be modified. For repeated crops, use
+    `CompiledGraph.crop`, which only visits the nodes near the box and returns a view.
+    """
+    nodes = list(node_pos.keys())
+    xy = np.array(list(node_pos.values()), dtype=float).reshape(-1, 2)
+    bbox = np.asarray(bbox, dtype=float)
+    inside = np.all((xy >= bbox[:, 0]) & (xy <= bbox[:, 1]), axis=1)
+    return G.__class__(G.subgraph(nodes[i] for i in np.flatnonzero(inside).tolist()))
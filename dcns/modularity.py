@@ -1,43 +1,263 @@
-import itertools
-from typing import Iterable
+from typing import Iterable, Optional, Union
 
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
+from numpy.typing import NDArray
 
 
-def modularity(G: nx.DiGraph, c: Iterable[set[str]]):
+def community_labels(nodes: list, c: Iterable[set]) -> NDArray[np.intp]:
+    """Convert a list of communities (sets of nodes) to a community label per node"""
     d = {n: k for k, v in enumerate(c) for n in v}
+    return np.fromiter((d[n] for n in nodes), dtype=np.intp, count=len(nodes))
 
-    L = sum(data["weight"] for _, _, data in G.edges.data())
-
-    Q, Qmax = 0, 1
-    for u, v in itertools.product(G.nodes(), repeat=2):
-        if d[u] == d[v]:
-            Auv = G[v][u].get("weight", 0) if G.has_edge(v, u) else 0
-            Q += (
-                Auv
-                - G.in_degree(u, weight="weight") * G.out_degree(v, weight="weight") / L
-            ) / L
-            Qmax -= (
-                G.in_degree(u, weight="weight") * G.out_degree(v, weight="weight") / L
-            ) / L
-    return Q, Qmax
-
-
-def scalar_assortativity(G, d: dict):
-    x = np.zeros(G.number_of_nodes())
-    for i, n in enumerate(G.nodes()):
-        x[i] = d[n]
-
-    A = nx.to_numpy_array(G).T
-    M = 2 * A.sum().sum()
-    ki = A.sum(axis=1)  # row sum is in-degree
-    ko = A.sum(axis=0)  # column sum is out-degree
-    mu = (np.dot(ki, x) + np.dot(ko, x)) / M
-
-    R, Rmax = 0, 0
-    for i, j in itertools.product(range(G.number_of_nodes()), repeat=2):
-        R += (A[i, j] * (x[i] - mu) * (x[j] - mu)) / M
-        Rmax += (A[i, j] * (x[i] - mu) ** 2) / M
-
-    return R, Rmax
+
+def modularity_matrix(
+    A: Union[sp.spmatrix, sp.csr_array], labels: NDArray[np.intp], resolution=1.0
+):
+    """Directed modularity of a partition from a sparse adjacency matrix.
+
+    O(E + C) for E edges and C communities.
+
+    Parameters
+    ----------
+    A: sparse array of shape (N, N)
+        `A[u, v]` is the weight of edge u->v
+    labels: int array of shape (N,)
+        Community label of each node
+    resolution: float
+
+    Returns
+    -------
+    Q: modularity
+    Qmax: the maximum modularity for the partition (if every edge were inside a
+        community). Both are 0 for a graph without edges.
+    """
+    A = sp.coo_array(A)
+    L = A.data.sum()
+    if L == 0:
+        return 0.0, 0.0
+    k_out = np.bincount(A.row, weights=A.data, minlength=A.shape[0])
+    k_in = np.bincount(A.col, weights=A.data, minlength=A.shape[0])
+
+    # Weight of the edges inside communities
+    inside = A.data[labels[A.row] == labels[A.col]].sum()
+
+    # Expected weight inside communities: Σ_c K_in(c) * K_out(c) / L
+    expected = np.dot(np.bincount(labels, k_in), np.bincount(labels, k_out)) / L
+
+    Q = (inside - resolution * expected) / L
+    Qmax = 1 - resolution * expected / L
+    return float(Q), float(Qmax)
+
+
+def modularity(G: nx.DiGraph, c: Iterable[set[str]], weight="weight"):
+    """Directed modularity of a graph partitioned into communities.
+
+    Returns
+    -------
+    Q: modularity
+    Qmax: maximum modularity for the partition
+    """
+    nodes = list(G.nodes())
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight)
+    return modularity_matrix(A, community_labels(nodes, c))
+
+
+def _louvain_level(
+    A: sp.csr_array, resolution: float, threshold: float, rng: np.random.Generator
+) -> tuple[NDArray[np.intp], bool]:
+    """Local moving phase of directed Louvain on one level of the graph.
+
+    Returns the (renumbered) community of each node and whether any node moved.
+    """
+    N = A.shape[0]
+    L = A.sum()
+    k_out = A.sum(axis=1)
+    k_in = A.sum(axis=0)
+
+    # Outgoing and incoming neighbors of each node, without self-loops
+    out_adj = A.tolil()
+    out_adj.setdiag(0)
+    out_adj = out_adj.tocsr()
+    out_adj.eliminate_zeros()
+    in_adj = out_adj.T.tocsr()
+    out_ptr, out_idx, out_w = out_adj.indptr, out_adj.indices, out_adj.data
+    in_ptr, in_idx, in_w = in_adj.indptr, in_adj.indices, in_adj.data
+
+    labels = np.arange(N)
+    # Total in/out weight of each community
+    comm_in = k_in.copy()
+    comm_out = k_out.copy()
+
+    improved = False
+    moved = True
+    while moved:
+        moved = False
+        for i in rng.permutation(N).tolist():
+            ci = labels[i]
+
+            # Weight between i and each neighboring community, in both directions
+            links: dict[int, float] = {}
+            for j, w in zip(
+                out_idx[out_ptr[i] : out_ptr[i + 1]].tolist(),
+                out_w[out_ptr[i] : out_ptr[i + 1]].tolist(),
+            ):
+                links[labels[j]] = links.get(labels[j], 0.0) + w
+            for j, w in zip(
+                in_idx[in_ptr[i] : in_ptr[i + 1]].tolist(),
+                in_w[in_ptr[i] : in_ptr[i + 1]].tolist(),
+            ):
+                links[labels[j]] = links.get(labels[j], 0.0) + w
+
+            # Take i out of its community
+            comm_in[ci] -= k_in[i]
+            comm_out[ci] -= k_out[i]
+
+            # ΔQ·L for inserting i into community c:
+            # w(i <-> c) - γ (k_out(i) K_in(c) + k_in(i) K_out(c)) / L
+            def gain(c: int) -> float:
+                return (
+                    links.get(c, 0.0)
+                    - resolution * (k_out[i] * comm_in[c] + k_in[i] * comm_out[c]) / L
+                )
+
+            best, best_gain = ci, gain(ci)
+            for c in links:
+                g = gain(c)
+                if g > best_gain + threshold:
+                    best, best_gain = c, g
+
+            comm_in[best] += k_in[i]
+            comm_out[best] += k_out[i]
+            if best != ci:
+                labels[i] = best
+                moved = improved = True
+
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels, improved
+
+
+def louvain_labels(
+    A: Union[sp.spmatrix, sp.csr_array], resolution=1.0, threshold=1e-7, seed=None
+) -> NDArray[np.intp]:
+    """Detect communities with the directed Louvain algorithm.
+
+    Nodes are greedily moved to the neighboring community with the largest directed
+    modularity gain, then each community is collapsed into a single node, until the
+    modularity stops improving.
+
+    Parameters
+    ----------
+    A: sparse array of shape (N, N)
+        `A[u, v]` is the weight of edge u->v
+    resolution: float
+        Larger values give smaller communities
+    threshold: float
+        Minimum modularity gain (times total weight) to move a node
+    seed: int (optional)
+
+    Returns
+    -------
+    int array of shape (N,) with the community of each node. Without any edge weight,
+    every node is its own community.
+    """
+    rng = np.random.default_rng(seed)
+    A = sp.csr_array(A, dtype=float)
+    labels = np.arange(A.shape[0])
+    if A.sum() == 0:
+        return labels
+
+    while True:
+        level_labels, improved = _louvain_level(A, resolution, threshold, rng)
+        if not improved:
+            break
+        labels = level_labels[labels]
+
+        # Collapse each community into a node: A' = Pᵀ A P
+        P = sp.csr_array(
+            (np.ones(len(level_labels)), (np.arange(len(level_labels)), level_labels))
+        )
+        A = (P.T @ A @ P).tocsr()
+
+    return labels
+
+
+def louvain_communities(
+    G: nx.DiGraph, weight="weight", resolution=1.0, threshold=1e-7, seed=None
+) -> list[set]:
+    """Detect communities of a directed graph with the Louvain algorithm.
+
+    See `louvain_labels` for the parameters.
+
+    Returns
+    -------
+    list of sets of nodes, largest community first
+    """
+    nodes = list(G.nodes())
+    if not nodes:
+        return []
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight)
+    labels = louvain_labels(A, resolution=resolution, threshold=threshold, seed=seed)
+
+    communities: list[set] = [set() for _ in range(labels.max() + 1)]
+    for node, label in zip(nodes, labels.tolist()):
+        communities[label].add(node)
+    return sorted(communities, key=len, reverse=True)
+
+
+def scalar_assortativity_multi(
+    G: nx.DiGraph,
+    attrs: Union[dict[str, dict], Iterable[str]],
+    weight: Optional[str] = "weight",
+) -> dict[str, tuple[float, float]]:
+    """Scalar assortativity of a directed graph for several node attributes at once.
+
+    Computed over the weighted edge list, so no dense matrix is built.
+
+    Parameters
+    ----------
+    G: nx.DiGraph
+    attrs: dict of name -> {node: value}, or iterable of node attribute names
+    weight: str (optional)
+        Edge attribute to use as the weight. If None, every edge has weight 1.
+
+    Returns
+    -------
+    dict of name -> (R, Rmax)
+    """
+    if not isinstance(attrs, dict):
+        attrs = {name: nx.get_node_attributes(G, name) for name in attrs}
+
+    nodes = list(G.nodes())
+    node_index = {n: i for i, n in enumerate(nodes)}
+    names = list(attrs.keys())
+    # (N, k) matrix with a column for each attribute
+    X = np.array([[attrs[name][n] for name in names] for n in nodes], dtype=float)
+    X = X.reshape(len(nodes), len(names))
+
+    E = G.number_of_edges()
+    src = np.empty(E, dtype=np.intp)
+    dst = np.empty(E, dtype=np.intp)
+    w = np.empty(E)
+    for e, (u, v, wt) in enumerate(G.edges(data=weight, default=1)):
+        src[e], dst[e], w[e] = node_index[u], node_index[v], 1 if weight is None else wt
+
+    M = 2 * w.sum()
+    mu = (w @ X[dst] + w @ X[src]) / M
+    Xs, Xt = X[src] - mu, X[dst] - mu
+    R = (w @ (Xt * Xs)) / M
+    Rmax = (w @ Xt**2) / M
+
+    return {name: (float(r), float(rmax)) for name, r, rmax in zip(names, R, Rmax)}
+
+
+def scalar_assortativity(G, d: dict, weight: Optional[str] = "weight"):
+    """Scalar assortativity of a directed graph for a node attribute.
+
+    Returns
+    -------
+    R: assortativity
+    Rmax: maximum assortativity
+    """
+    return scalar_assortativity_multi(G, {"x": d}, weight=weight)["x"]
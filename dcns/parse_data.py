@@ -11,12 +11,20 @@ from matplotlib import pyplot as plt
 from tqdm import tqdm
 
 try:
-    from .close_edges import with_close_edges
-    from .graph_utils import node_attr_ndarray_to_list, remove_edge_attrs
+    from .close_edges import with_walking_edges
+    from .graph_utils import (
+        AttributeStore,
+        node_attr_ndarray_to_list,
+        remove_edge_attrs,
+    )
     from .plot_graphs import plot_graph
 except ImportError:
-    from close_edges import with_close_edges  # type: ignore
-    from graph_utils import node_attr_ndarray_to_list, remove_edge_attrs  # type: ignore
+    from close_edges import with_walking_edges  # type: ignore
+    from graph_utils import (  # type: ignore
+        AttributeStore,
+        node_attr_ndarray_to_list,
+        remove_edge_attrs,
+    )
     from plot_graphs import plot_graph  # type: ignore
 
 DATA_DIR = Path(__file__).parent / "../data/"
@@ -110,12 +118,9 @@ def get_stop_pos(stops) -> dict:
         { node_id: np.array([x, y]), ... }
     In the case of the stops data, this looks like:
         { stop_id: np.array([stop_lon, stop_lat]), ... }
+    Each array is a row of one contiguous (N, 2) array.
     """
-    return (
-        stops.set_index("stop_id")[["stop_lon", "stop_lat"]]
-        .apply(lambda row: np.array(row.values), axis=1)
-        .to_dict()
-    )
+    return AttributeStore.from_stops(stops).pos()
 
 
 def add_edge_attributes(G):
@@ -147,12 +152,12 @@ def save_gml(G, output_path):
 # Full Graph
 G = make_graph()
 
-# Largest component
-G2 = G.__class__(G.subgraph(max(nx.strongly_connected_components(G), key=len)))
+# Largest component (a view of G, not a copy)
+G2 = G.subgraph(max(nx.strongly_connected_components(G), key=len))
 
-# With close edges
-close_edge_threshold = 0.00085
-G3 = with_close_edges(G2, close_edge_threshold, avg_trip_time=20, num_trips=100_000)
+# With close edges, weighted by walking time
+close_edge_threshold = 90  # meters
+G3 = with_walking_edges(G2, close_edge_threshold, num_trips=100_000)
 
 save_gml(G, DATA_DIR / "dartstops_full.gml")
 save_gml(G2, DATA_DIR / "dartstops_largest_component.gml")
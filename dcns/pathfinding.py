@@ -1,11 +1,12 @@
 import heapq
+import itertools
 from collections import deque
-from typing import Callable, Generator, Optional, Union
+from typing import Callable, Generator, Iterable, NamedTuple, Optional, Union
 
 import networkx as nx
 import numpy as np
 
-from .graph_utils import Graph, Node, PosDict
+from .graph_utils import AttributeStore, Graph, Node, PosDict, pos_to_array
 
 SearchGenerator = Generator[tuple[dict[Node, None], dict[Node, float]], None, None]
 """Pathfinding search generator.
@@ -16,6 +17,12 @@ predecessor: dict
 distance: dict
 """
 
+NodeOffsets = Union[Iterable[Node], dict[Node, float]]
+"""Set of nodes, or dictionary of nodes to an offset added to their path length"""
+
+# Heap entry for the virtual node reached from every end node in a multi-target search
+_END = object()
+
 
 class NoPathBetweenNodes(ValueError):
     def __init__(self, node1: str, node2: str):
@@ -89,7 +96,7 @@ def astar_dist_search(
     graph: Graph,
     start: Node,
     end: Node,
-    node_pos: Optional[PosDict] = None,
+    node_pos: Optional[Union[PosDict, AttributeStore]] = None,
     dist_func: Optional[Callable[[float], float]] = None,
     weight="weight",
 ) -> SearchGenerator:
@@ -97,12 +104,17 @@ def astar_dist_search(
         node_pos = nx.get_node_attributes(graph, "pos")
         assert node_pos is not None
 
-    heuristic = {
-        node: float(np.linalg.norm(pos - node_pos[end]))
-        for node, pos in node_pos.items()
-    }
+    # Compute the distance to the end node for every node at once
+    nodes, coords = pos_to_array(node_pos)
+    # Raises KeyError if the end node has no position
+    if isinstance(node_pos, AttributeStore):
+        end_pos = coords[node_pos.node_index[end]]
+    else:
+        end_pos = np.asarray(node_pos[end], dtype=float)
+    dists = np.linalg.norm(coords - end_pos, axis=1).tolist()
     if dist_func is not None:
-        heuristic = {node: dist_func(dist) for node, dist in heuristic.items()}
+        dists = [dist_func(dist) for dist in dists]
+    heuristic = dict(zip(nodes, dists))
 
     yield from astar_search(graph, start, end, heuristic=heuristic, weight=weight)
 
@@ -163,9 +175,171 @@ def bfs_search(
     raise NoPathBetweenNodes(start, end)
 
 
+def multi_astar_search(
+    graph: Graph,
+    starts: NodeOffsets,
+    ends: NodeOffsets,
+    heuristic: Optional[Union[dict[Node, float], Callable[[Node, Node], float]]] = None,
+    weight="weight",
+) -> SearchGenerator:
+    """Find the shortest path from any start node to any end node using the a* algorithm.
+
+    The heap is seeded with every start node and the search terminates once the first
+    end node is settled. Offsets given for the start or end nodes (e.g., walking time to
+    or from a stop) are added to the length of paths starting or ending there.
+
+    Parameters
+    ----------
+    heuristic: dict or func(Node, Node) -> float (optional)
+        A dictionary gives the estimate from each node to the nearest end node. A
+        function gives the estimate between a pair of nodes; it is only evaluated for
+        discovered nodes, using the smallest estimate (plus end offset) over the end
+        nodes.
+    """
+    is_directed = isinstance(graph, nx.DiGraph)
+    start_offset = node_offsets(starts)
+    end_offset = node_offsets(ends)
+
+    # Coerce the heuristic into a function of a single node
+    if heuristic is None:
+        h: Callable[[Node], float] = lambda node: 0.0
+    elif callable(heuristic):
+        pair_heuristic = heuristic
+        h = lambda node: min(
+            pair_heuristic(node, end) + offset for end, offset in end_offset.items()
+        )
+    else:
+        h = heuristic.__getitem__
+
+    # Only discovered nodes are stored, so a short search doesn't pay for the whole graph
+    distance: dict[Node, float] = dict(start_offset)
+    predecessor: dict[Node, Node] = {}
+    settled: set[Node] = set()
+
+    # Break ties by insertion order so nodes are never compared to each other
+    counter = itertools.count()
+    heap = [
+        (offset + h(start), next(counter), start)
+        for start, offset in start_offset.items()
+    ]
+    heapq.heapify(heap)
+
+    while heap:
+        _, _, curr_node = heapq.heappop(heap)
+
+        # The virtual end node is settled once the best end node + offset is reached
+        if curr_node is _END:
+            yield predecessor, distance
+            return
+
+        # Skip stale heap entries
+        if curr_node in settled:
+            continue
+        settled.add(curr_node)
+        curr_dist = distance[curr_node]
+
+        if curr_node in end_offset:
+            heapq.heappush(
+                heap, (curr_dist + end_offset[curr_node], next(counter), _END)
+            )
+
+        neighbors = (
+            graph.successors(curr_node) if is_directed else graph.neighbors(curr_node)  # type: ignore
+        )
+        for neighbor in neighbors:
+            new_dist = curr_dist + graph[curr_node][neighbor][weight]
+            if new_dist < distance.get(neighbor, float("inf")):
+                distance[neighbor] = new_dist
+                predecessor[neighbor] = curr_node
+                heapq.heappush(heap, (new_dist + h(neighbor), next(counter), neighbor))
+
+        yield predecessor, distance
+
+    raise NoPathBetweenNodes(tuple(start_offset), tuple(end_offset))  # type: ignore
+
+
+def multi_astar_dist_search(
+    graph: Graph,
+    starts: NodeOffsets,
+    ends: NodeOffsets,
+    node_pos: Optional[PosDict] = None,
+    dist_func: Optional[Callable[[float], float]] = None,
+    weight="weight",
+) -> SearchGenerator:
+    """Multi-source/multi-target a* search using distance to the nearest end node as the
+    heuristic."""
+    if node_pos is None:
+        node_pos = nx.get_node_attributes(graph, "pos")
+        assert node_pos is not None
+
+    if dist_func is None:
+        dist_func = lambda dist: dist
+
+    def heuristic(node: Node, end: Node) -> float:
+        return dist_func(float(np.linalg.norm(node_pos[node] - node_pos[end])))  # type: ignore
+
+    yield from multi_astar_search(
+        graph, starts, ends, heuristic=heuristic, weight=weight
+    )
+
+
+def multi_dijkstra_search(
+    graph: Graph, starts: NodeOffsets, ends: NodeOffsets, weight="weight"
+) -> SearchGenerator:
+    """Find the shortest path from any start node to any end node using Dijkstra's algorithm."""
+    yield from multi_astar_search(graph, starts, ends, weight=weight)
+
+
+def multi_bfs_search(
+    graph: Graph, starts: NodeOffsets, ends: NodeOffsets, weight="weight"
+) -> SearchGenerator:
+    """Find a path from any start node to any end node using Breadth-First Search.
+
+    The queue is seeded with every start node and the search terminates once the first
+    end node is dequeued. Start offsets are added to the path length, but do not change
+    the order of the search.
+    """
+    is_directed = isinstance(graph, nx.DiGraph)
+    start_offset = node_offsets(starts)
+    end_offset = node_offsets(ends)
+
+    distance: dict[Node, float] = dict(start_offset)
+    predecessor: dict[Node, Node] = {}
+    queue = deque(start_offset)
+
+    while queue:
+        curr_node = queue.popleft()
+
+        if curr_node in end_offset:
+            yield predecessor, distance
+            return
+
+        neighbors = (
+            graph.successors(curr_node) if is_directed else graph.neighbors(curr_node)  # type: ignore
+        )
+        for neighbor in neighbors:
+            if neighbor not in distance:
+                distance[neighbor] = (
+                    distance[curr_node] + graph[curr_node][neighbor][weight]
+                )
+                predecessor[neighbor] = curr_node
+                queue.append(neighbor)
+
+        yield predecessor, distance
+
+    raise NoPathBetweenNodes(tuple(start_offset), tuple(end_offset))  # type: ignore
+
+
 ### GENERIC PATHFINDING FUNCTIONS ###
 
 
+def node_offsets(nodes: NodeOffsets) -> dict[Node, float]:
+    """Coerce a set of nodes or a dictionary of node offsets into a dictionary."""
+    if isinstance(nodes, dict):
+        return nodes
+    return {node: 0.0 for node in nodes}
+
+
 def predecessor_path(predecessor: dict, start: Node, end: Node):
     # Construct the shortest path from the predecessor dictionary
     path = [end]
@@ -189,43 +363,115 @@ def pathfind(search_generator: SearchGenerator, start: Node, end: Node):
     return path, distance[end], len(predecessor)
 
 
-def pathfind_steps(
-    search_generator: SearchGenerator, start: Node, end: Node, sample_steps=(100, 5)
-):
-    """Get a tuple of (searched_nodes, path_nodes) for each pathfinding solve step.
+def pathfind_multi(search_generator: SearchGenerator, ends: dict[Node, float]):
+    """Generic pathfind using a multi-source/multi-target search generator.
 
     Parameters
     ----------
-    sample_steps: Take every n samples of the predecessors or search steps
+    ends: dict of Node -> float
+        The end node offsets the search generator was created with
+
+    Returns
+    -------
+    final_path: list of Nodes, from the best start node to the best end node
+    distance: length of path (sum of edgeweights and start/end offsets)
+    num_nodes_searched: number of nodes searched before finding the path
     """
-    # Search phase
     try:
-        # We have to make a copy of each dictionary because it is mutated at each step.
-        predecessors = [dict(predecessor) for predecessor, _ in search_generator]
+        predecessor, distance = deque(search_generator, maxlen=1).pop()
     except NoPathBetweenNodes:
         raise
 
-    steps: list[tuple[tuple[Node, ...], tuple[Node, ...]]] = [
-        (tuple(predecessor.keys()), ())
-        for predecessor in predecessors[:: sample_steps[0]]
-    ]
+    # Take the discovered end node with the shortest total length. For the heap-based
+    # searches, this is the end node that was settled.
+    end = min(
+        (node for node in ends if node in distance),
+        key=lambda node: distance[node] + ends[node],
+    )
+
+    # Start nodes are the only nodes without a predecessor
+    path = [end]
+    while path[-1] in predecessor:
+        path.append(predecessor[path[-1]])
+    path.reverse()
 
-    final_predecessors = tuple(predecessors[-1].keys())
+    return path, distance[end] + ends[end], len(predecessor)
 
-    # Path phase
-    paths = [tuple(path) for path in predecessor_path(predecessors[-1], start, end)]
 
+class SearchEvents(NamedTuple):
+    """Everything needed to replay a search, without copying its state at every step"""
+
+    discovered: list[Node]
+    """Nodes in the order they were first added to the predecessors"""
+    counts: list[int]
+    """Number of discovered nodes after each search step"""
+    path: list[Node]
+    """Shortest path from the end node back to the start node"""
+
+
+def search_events(
+    search_generator: SearchGenerator, start: Node, end: Node
+) -> SearchEvents:
+    """Run a search to completion, recording how many nodes it had reached per step.
+
+    Search generators only ever add nodes to the predecessor dictionary, so its
+    insertion order is the discovery order and the state at step i is the first
+    `counts[i]` discovered nodes.
+    """
+    predecessor: dict = {}
+    counts = []
+    for predecessor, _ in search_generator:
+        counts.append(len(predecessor))
+    if not counts:
+        raise ValueError("Search generator did not take any steps")
+
+    # The path walk is a list that grows to the full path, so keep the final one
+    path: list[Node] = [end]
+    for path in predecessor_path(predecessor, start, end):
+        pass
+    return SearchEvents(list(predecessor), counts, path)
+
+
+def step_counts(events: SearchEvents, sample_steps=(100, 5)) -> list[tuple[int, int]]:
+    """Number of (searched nodes, path nodes) shown at each sampled step of a search.
+
+    Parameters
+    ----------
+    events: SearchEvents
+    sample_steps: Take every n samples of the predecessors or search steps
+    """
+    # Search phase
+    steps = [(count, 0) for count in events.counts[:: sample_steps[0]]]
+
+    # Path phase
+    num_discovered = len(events.discovered)
+    path_lengths = range(2, len(events.path) + 1)
     steps.extend(
-        (final_predecessors, tuple(path)) for path in paths[:: sample_steps[1]]
+        (num_discovered, length) for length in path_lengths[:: sample_steps[1]]
     )
 
     # Make sure to include the last step in there
-    if len(paths) - 1 % sample_steps[1] != 0:
-        steps.append((final_predecessors, paths[-1]))
+    steps.append((num_discovered, len(events.path)))
 
     return steps
 
 
+def pathfind_steps(
+    search_generator: SearchGenerator, start: Node, end: Node, sample_steps=(100, 5)
+):
+    """Get a tuple of (searched_nodes, path_nodes) for each pathfinding solve step.
+
+    Parameters
+    ----------
+    sample_steps: Take every n samples of the predecessors or search steps
+    """
+    events = search_events(search_generator, start, end)
+    return [
+        (tuple(events.discovered[:num_searched]), tuple(events.path[:num_path]))
+        for num_searched, num_path in step_counts(events, sample_steps)
+    ]
+
+
 ### ACTUAL PATHFINDING FUNCTIONS ###
 
 
@@ -258,7 +504,7 @@ def astar_dist(
     graph: Graph,
     start: Node,
     end: Node,
-    node_pos: PosDict,
+    node_pos: Union[PosDict, AttributeStore],
     dist_func: Optional[Callable[[float], float]] = None,
     weight="weight",
 ):
@@ -317,3 +563,101 @@ def bfs(graph: Graph, start: Node, end: Node, weight="weight"):
         return pathfind(bfs_search(graph, start, end, weight=weight), start, end)
     except NoPathBetweenNodes:
         raise
+
+
+def multi_dijkstra(
+    graph: Graph, starts: NodeOffsets, ends: NodeOffsets, weight="weight"
+):
+    """Get the shortest path from any start node to any end node using Dijkstra's algorithm.
+
+    Returns
+    -------
+    final_path: list of Nodes
+    distance: length of path (sum of edgeweights and start/end offsets)
+    num_nodes_searched: number of nodes searched before finding the path
+    """
+    ends = node_offsets(ends)
+    try:
+        return pathfind_multi(
+            multi_dijkstra_search(graph, starts, ends, weight=weight), ends
+        )
+    except NoPathBetweenNodes:
+        raise
+
+
+def multi_astar(
+    graph: Graph,
+    starts: NodeOffsets,
+    ends: NodeOffsets,
+    heuristic: Optional[Union[dict[Node, float], Callable[[Node, Node], float]]] = None,
+    weight="weight",
+):
+    """Get the shortest path from any start node to any end node using the a* algorithm.
+
+    Returns
+    -------
+    final_path: list of Nodes
+    distance: length of path (sum of edgeweights and start/end offsets)
+    num_nodes_searched: number of nodes searched before finding the path
+    """
+    ends = node_offsets(ends)
+    try:
+        return pathfind_multi(
+            multi_astar_search(graph, starts, ends, heuristic=heuristic, weight=weight),
+            ends,
+        )
+    except NoPathBetweenNodes:
+        raise
+
+
+def multi_astar_dist(
+    graph: Graph,
+    starts: NodeOffsets,
+    ends: NodeOffsets,
+    node_pos: PosDict,
+    dist_func: Optional[Callable[[float], float]] = None,
+    weight="weight",
+):
+    """Get the shortest path from any start node to any end node using the a* algorithm.
+
+    Uses distance to the nearest end node as the heuristic
+
+    Returns
+    -------
+    final_path: list of Nodes
+    distance: length of path (sum of edgeweights and start/end offsets)
+    num_nodes_searched: number of nodes searched before finding the path
+    """
+    ends = node_offsets(ends)
+    try:
+        return pathfind_multi(
+            multi_astar_dist_search(
+                graph,
+                starts,
+                ends,
+                node_pos=node_pos,
+                dist_func=dist_func,
+                weight=weight,
+            ),
+            ends,
+        )
+    except NoPathBetweenNodes:
+        raise
+
+
+def multi_bfs(graph: Graph, starts: NodeOffsets, ends: NodeOffsets, weight="weight"):
+    """Get a path from any start node to any end node using Breadth-First Search.
+
+    Returns
+    -------
+    final_path: list of Nodes
+    distance: length of path (sum of edgeweights and start/end offsets)
+    num_nodes_searched: number of nodes searched before finding the path
+    """
+    ends = node_offsets(ends)
+    try:
+        return pathfind_multi(
+            multi_bfs_search(graph, starts, ends, weight=weight), ends
+        )
+    except NoPathBetweenNodes:
+        raise
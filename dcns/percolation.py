@@ -0,0 +1,213 @@
+"""Bond percolation (random edge failure) on a compiled graph.
+
+Edges are kept with probability p. Every realization draws one uniform number per
+edge and keeps the edges whose number is below p, so the realizations for every p in a
+sweep are nested (coupled) and no graph is ever copied.
+"""
+
+from typing import Iterable, NamedTuple, Optional, Union
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from scipy.sparse.csgraph import dijkstra
+from scipy.stats import binom
+from tqdm import tqdm
+
+from dcns.compiled_graph import CompiledGraph
+from dcns.graph_utils import Node
+
+SeedLike = Optional[Union[int, np.random.SeedSequence, np.random.Generator]]
+
+
+class PercolationCurve(NamedTuple):
+    """Largest (weakly-connected) cluster size as a function of p"""
+
+    p: NDArray[np.floating]
+    largest_cluster: NDArray[np.floating]
+    """Mean fraction of nodes in the largest cluster"""
+    largest_cluster_std: NDArray[np.floating]
+    """Standard deviation of the fraction of nodes in the largest cluster"""
+
+
+class PathSurvival(NamedTuple):
+    """Survival and stretch of a set of queried paths as a function of p"""
+
+    p: NDArray[np.floating]
+    survival: NDArray[np.floating]
+    """Mean fraction of (originally connected) queries that still have a path"""
+    stretch: NDArray[np.floating]
+    """Mean ratio of surviving path length to the original path length, over queries
+    with a nonzero original length"""
+    distance: NDArray[np.floating]
+    """Path lengths with shape (len(p), num_realizations, num_queries). inf if broken"""
+    baseline: NDArray[np.floating]
+    """Path lengths on the intact graph with shape (num_queries,)"""
+
+
+def edge_retention_masks(
+    num_edges: int, ps: ArrayLike, rng: np.random.Generator
+) -> NDArray[np.bool_]:
+    """Sample one coupled realization of edge retention masks for each p.
+
+    Returns
+    -------
+    bool array of shape (len(ps), num_edges), where `masks[i, e]` is True if edge `e`
+    is kept with probability `ps[i]`
+    """
+    u = rng.random(num_edges)
+    return u[np.newaxis, :] < np.asarray(ps, dtype=float)[:, np.newaxis]
+
+
+def largest_cluster_sizes(
+    num_nodes: int, src: NDArray[np.intp], dst: NDArray[np.intp]
+) -> NDArray[np.intp]:
+    """Size of the largest cluster as the edges are added one by one (Newman-Ziff).
+
+    Edges are added in the order given, treating them as undirected.
+
+    Returns
+    -------
+    int array of shape (len(src) + 1,), where entry n is the largest cluster size after
+    adding the first n edges
+    """
+    parent = list(range(num_nodes))
+    size = [1] * num_nodes
+    largest = 1 if num_nodes else 0
+    sizes = np.empty(len(src) + 1, dtype=np.intp)
+    sizes[0] = largest
+
+    def find(i: int) -> int:
+        # Path halving
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for n, (u, v) in enumerate(zip(src.tolist(), dst.tolist()), start=1):
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            # Union by size
+            if size[ru] < size[rv]:
+                ru, rv = rv, ru
+            parent[rv] = ru
+            size[ru] += size[rv]
+            if size[ru] > largest:
+                largest = size[ru]
+        sizes[n] = largest
+
+    return sizes
+
+
+def percolation_curve(
+    cg: CompiledGraph,
+    ps: ArrayLike,
+    num_realizations=100,
+    seed: SeedLike = None,
+    show_progress=True,
+) -> PercolationCurve:
+    """Largest cluster size for a sweep of edge retention probabilities.
+
+    Uses the Newman-Ziff algorithm: each realization adds the edges in a random order
+    with union-find, which gives the largest cluster for every number of occupied edges
+    n at once. The result for each p is the binomial-weighted average over n.
+    """
+    rng = np.random.default_rng(seed)
+    ps = np.asarray(ps, dtype=float)
+    E, N = cg.num_edges, cg.num_nodes
+
+    # Accumulate the first two moments of the cluster size for each n
+    s1 = np.zeros(E + 1)
+    s2 = np.zeros(E + 1)
+    for _ in tqdm(range(num_realizations), disable=not show_progress):
+        order = rng.permutation(E)
+        sizes = largest_cluster_sizes(N, cg.src[order], cg.dst[order]) / N
+        s1 += sizes
+        s2 += sizes**2
+    s1 /= num_realizations
+    s2 /= num_realizations
+
+    # Convolve with the binomial distribution of the number of occupied edges
+    weights = binom.pmf(np.arange(E + 1)[np.newaxis, :], E, ps[:, np.newaxis])
+    mean = weights @ s1
+    var = np.maximum(weights @ s2 - mean**2, 0)
+
+    return PercolationCurve(ps, mean, np.sqrt(var))
+
+
+def path_survival(
+    cg: CompiledGraph,
+    queries: Iterable[tuple[Node, Node]],
+    ps: ArrayLike,
+    num_realizations=100,
+    unweighted=False,
+    seed: SeedLike = None,
+    show_progress=True,
+) -> PathSurvival:
+    """Monte Carlo survival and stretch of shortest paths under random edge failure.
+
+    Parameters
+    ----------
+    cg: CompiledGraph
+    queries: iterable of (start, end) Nodes
+    ps: array of edge retention probabilities
+    num_realizations: int
+        Number of random failure realizations per p
+    unweighted: bool
+        Measure path length in hops instead of edge weight
+    seed: int, SeedSequence, or Generator (optional)
+    show_progress: bool
+
+    Raises ValueError if no query has a path in the intact graph.
+    """
+    rng = np.random.default_rng(seed)
+    ps = np.asarray(ps, dtype=float)
+    queries = list(queries)
+    starts = cg.indices(q[0] for q in queries)
+    ends = cg.indices(q[1] for q in queries)
+
+    # Run a single search from each unique start node
+    sources, rows = np.unique(starts, return_inverse=True)
+
+    def query_distances(alive, edge_mask=None) -> NDArray[np.floating]:
+        """Path lengths of the queries, only searching from sources of `alive` ones"""
+        dist = np.full(len(queries), np.inf)
+        searched = np.unique(rows[alive])
+        if len(searched) == 0:
+            return dist
+        source_dist = dijkstra(
+            cg.csr(edge_mask),
+            directed=cg.directed,
+            indices=sources[searched],
+            unweighted=unweighted,
+        )
+        # Map each alive query to its row in the searched subset
+        row_of = np.empty(len(sources), dtype=np.intp)
+        row_of[searched] = np.arange(len(searched))
+        dist[alive] = source_dist[row_of[rows[alive]], ends[alive]]
+        return dist
+
+    baseline = query_distances(np.ones(len(queries), dtype=bool))
+    connected = np.isfinite(baseline)
+    if not connected.any():
+        raise ValueError("None of the queries have a path in the intact graph")
+
+    # The masks are nested, so a path broken at some p stays broken at every lower p.
+    # Visiting p in descending order lets us skip searches for already-broken queries.
+    descending = np.argsort(-ps, kind="stable")
+    distance = np.empty((len(ps), num_realizations, len(queries)))
+    for r in tqdm(range(num_realizations), disable=not show_progress):
+        masks = edge_retention_masks(cg.num_edges, ps, rng)
+        alive = connected
+        for i in descending:
+            distance[i, r] = query_distances(alive, masks[i])
+            alive = np.isfinite(distance[i, r])
+
+    survived = np.isfinite(distance) & connected
+    survival = survived[..., connected].mean(axis=(1, 2))
+    # Zero-length queries (e.g., start == end) have no meaningful stretch
+    stretched = survived & (baseline > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(stretched, distance / baseline, 0)
+        stretch = ratio.sum(axis=(1, 2)) / stretched.sum(axis=(1, 2))
+
+    return PathSurvival(ps, survival, stretch, distance, baseline)
@@ -1,63 +1,327 @@
 from functools import partial
-from typing import Callable, Optional
+from typing import Callable, Iterable, Optional, Union
 
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
 from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
+from numpy.typing import NDArray
 
-from dcns.graph_utils import Graph, Node, PosDict
-from dcns.pathfinding import SearchGenerator, pathfind_steps
+from dcns.graph_utils import AttributeStore, Graph, Node, PosDict, pos_to_array
+from dcns.pathfinding import (
+    SearchEvents,
+    SearchGenerator,
+    search_events,
+    step_counts,
+)
+
+# networkx drawing keys of a `plot_graph` style that map onto the node scatter
+_NODE_STYLE = {
+    "node_shape": "marker",
+    "linewidths": "linewidths",
+    "edgecolors": "edgecolors",
+    "label": "label",
+}
+_STYLE_KEYS = {"node_size", "node_color", "edge_color", "width", "alpha", "style"}
+
+Positions = Union[PosDict, AttributeStore, NDArray[np.floating]]
+"""Node positions as a dict, an `AttributeStore`, or an (N, 2) array in node order"""
+
+
+def node_coords(nodes: list[Node], pos: Positions) -> NDArray[np.floating]:
+    """Contiguous (N, 2) coordinates of `nodes`.
+
+    An array is taken to be in the order of `nodes` already. A dict or
+    `AttributeStore` may have more nodes than `nodes`; if it has exactly `nodes`, in
+    order, its coordinates are used without a copy.
+    """
+    if isinstance(pos, np.ndarray):
+        coords = np.ascontiguousarray(pos, dtype=float).reshape(-1, 2)
+        if len(coords) != len(nodes):
+            raise ValueError(f"Expected {len(nodes)} positions, got {len(coords)}")
+        return coords
+    pos_nodes, coords = pos_to_array(pos)
+    if pos_nodes == nodes:
+        return coords
+    index = (
+        pos.node_index
+        if isinstance(pos, AttributeStore)
+        else {node: i for i, node in enumerate(pos_nodes)}
+    )
+    rows = np.fromiter((index[n] for n in nodes), dtype=np.intp, count=len(nodes))
+    return coords[rows]
+
+
+def graph_arrays(
+    graph: Graph, pos: Positions, edges=None, attrs: Iterable[str] = ()
+) -> tuple[list[Node], NDArray[np.floating], NDArray[np.intp], NDArray[np.intp], dict]:
+    """Node coordinates, edge index arrays and edge attribute arrays of a graph.
+
+    Edges with an endpoint outside of `graph` are skipped. See `node_coords` for
+    `pos`.
+
+    Returns
+    -------
+    nodes: list of Nodes
+    coords: float array of shape (N, 2)
+    src, dst: int arrays of shape (E,)
+    values: dict of attribute -> float array of shape (E,), NaN where missing
+    """
+    nodes = list(graph.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+    coords = node_coords(nodes, pos)
+
+    edge_list = [
+        (u, v)
+        for u, v in (graph.edges() if edges is None else edges)
+        if u in node_index and v in node_index
+    ]
+    src = np.fromiter((node_index[u] for u, _ in edge_list), np.intp, len(edge_list))
+    dst = np.fromiter((node_index[v] for _, v in edge_list), np.intp, len(edge_list))
+
+    values = {}
+    for attr in attrs:
+        data = [(graph.get_edge_data(u, v) or {}).get(attr) for u, v in edge_list]
+        values[attr] = np.array([np.nan if x is None else x for x in data], dtype=float)
+    return nodes, coords, src, dst, values
+
+
+def draw_edges(
+    ax: plt.Axes,
+    coords: NDArray[np.floating],
+    src: NDArray[np.intp],
+    dst: NDArray[np.intp],
+    min_edge_length=0.0,
+    color: Optional[NDArray[np.floating]] = None,
+    width: Optional[NDArray[np.floating]] = None,
+    cmap="viridis",
+    norm: Optional[Normalize] = None,
+    width_range: tuple[float, float] = (0.2, 3.0),
+    edge_color="k",
+    edge_width=0.5,
+    alpha=0.4,
+    arrows=False,
+):
+    """Draw edges as a single collection.
+
+    Parameters
+    ----------
+    ax: plt.Axes
+    coords: float array of shape (N, 2)
+    src, dst: int arrays of shape (E,)
+        Node indices of each edge
+    min_edge_length: float
+        Edges of this length or shorter are not drawn
+    color: float array of shape (E,) (optional)
+        Values mapped to edge colors through `cmap` and `norm`
+    width: float array of shape (E,) (optional)
+        Values mapped linearly to edge widths in `width_range`
+    edge_color, edge_width:
+        Color and width of every edge if `color` or `width` isn't given
+    arrows: bool
+        Draw arrows (as one quiver) instead of lines
+
+    Returns
+    -------
+    LineCollection, or Quiver if `arrows` is True
+    """
+    start, end = coords[src], coords[dst]
+    keep = np.linalg.norm(end - start, axis=1) > min_edge_length
+    start, end = start[keep], end[keep]
+
+    if width is not None:
+        w = width[keep]
+        low, high = np.nanmin(w, initial=np.inf), np.nanmax(w, initial=-np.inf)
+        scaled = (w - low) / (high - low) if high > low else np.zeros_like(w)
+        linewidths = width_range[0] + np.nan_to_num(scaled) * np.subtract(
+            *width_range[::-1]
+        )
+    else:
+        linewidths = edge_width
+
+    if arrows:
+        delta = end - start
+        args = (start[:, 0], start[:, 1], delta[:, 0], delta[:, 1])
+        if color is not None:
+            args += (color[keep],)
+        collection = ax.quiver(
+            *args,
+            angles="xy",
+            scale_units="xy",
+            scale=1,
+            width=0.002,
+            color=None if color is not None else edge_color,
+            cmap=cmap if color is not None else None,
+            norm=norm,
+            alpha=alpha,
+            zorder=1,
+            # Quiver shafts have a single width, so the edge widths thicken the outline
+            # of each arrow instead
+            linewidths=linewidths,
+            edgecolors="face",
+        )
+    else:
+        collection = LineCollection(
+            np.stack((start, end), axis=1),
+            linewidths=linewidths,
+            colors=None if color is not None else edge_color,
+            cmap=cmap,
+            norm=norm,
+            alpha=alpha,
+            zorder=1,
+        )
+        if color is not None:
+            collection.set_array(color[keep])
+        ax.add_collection(collection)
+        ax.autoscale_view()
+    return collection
 
 
 def plot_graph(
     graph: Graph,
-    pos: PosDict,
+    pos: Positions,
     ax: plt.Axes,
     min_edge_length=0.007,
     style: Optional[dict] = None,
     edges=None,
+    edge_color: Optional[str] = None,
+    edge_width: Optional[str] = None,
+    cmap="viridis",
+    norm: Optional[Normalize] = None,
+    arrows=False,
 ):
     """Plot a graph but without edges below a threshold.
 
+    The edges are drawn as one `LineCollection` and the nodes as one scatter, so the
+    whole network draws quickly even with `min_edge_length=0`.
+
     Parameters
     ----------
     graph: nx.Graph | nx.DiGraph
-    pos: dic of positions
+    pos: dict of positions, AttributeStore, or (N, 2) array
+        Node positions. An array must be in the order of `graph.nodes()`.
     ax: plt.Axes
     min_edge_length: float
-        Edges below this length will not be plotted. Increase to plot faster, but display
-        fewer edges
+        Edges below this length will not be plotted
     style: dict (optional)
-        Style for graph
+        Style for graph, with the names of `nx.draw_networkx`: "node_size",
+        "node_color", "node_shape", "linewidths", "edgecolors", "label" (of the nodes),
+        "edge_color", "width", "style" (line style of the edges) and "alpha"
     edges: iterable of edges (optional)
-        If trying to plot a subgraph, there is a bug where the edges will not display.
-        If that is the case, pass in the edges from the original graph here.
+        Edges to draw instead of `graph.edges()`. Edges with an endpoint outside of
+        `graph` are skipped.
+    edge_color: str (optional)
+        Edge attribute to color the edges by, such as "num_trips" or "avg_trip_time"
+    edge_width: str (optional)
+        Edge attribute to scale the edge widths by
+    cmap: str | Colormap
+    norm: Normalize (optional)
+        Normalization of the `edge_color` values, such as `LogNorm()`
+    arrows: bool
+        Draw arrowheads on the edges
+
+    Returns
+    -------
+    nodes: PathCollection
+    edges: LineCollection (or Quiver if `arrows` is True)
     """
     if style is None:
         style = {}
-    # Only draw edges over a threshold for faster displaying. It is very dumb that we
-    # need to check the endpoints of the edges being in the component's nodes, but for
-    # some reason, doing G.edges() on the subgraph yields no edges, so this is the only
-    # way.
-    edges = [
-        (u, v)
-        for u, v in edges or graph.edges()
-        if np.linalg.norm(pos[u] - pos[v]) > min_edge_length
-        and u in graph.nodes
-        and v in graph.nodes
-    ]
-    nx.draw_networkx_edges(
-        graph,
-        pos=pos,
-        ax=ax,
-        edgelist=edges,
-        alpha=0.4,
-        width=0.5,
-        **style,
+    unknown = style.keys() - _STYLE_KEYS - _NODE_STYLE.keys()
+    if unknown:
+        raise ValueError(f"Unsupported style keys: {sorted(unknown)}")
+    attrs = [attr for attr in (edge_color, edge_width) if attr is not None]
+    _, coords, src, dst, values = graph_arrays(graph, pos, edges, attrs)
+
+    edge_collection = draw_edges(
+        ax,
+        coords,
+        src,
+        dst,
+        min_edge_length=min_edge_length,
+        color=None if edge_color is None else values[edge_color],
+        width=None if edge_width is None else values[edge_width],
+        cmap=cmap,
+        norm=norm,
+        edge_color=style.get("edge_color", "k"),
+        edge_width=style.get("width", 0.5),
+        alpha=style.get("alpha", 0.4),
+        arrows=arrows,
+    )
+    if "style" in style:
+        edge_collection.set_linestyle(style["style"])
+    node_collection = ax.scatter(
+        coords[:, 0],
+        coords[:, 1],
+        s=style.get("node_size", 300),
+        c=style.get("node_color", "tab:blue"),
+        alpha=style.get("alpha"),
+        zorder=2,
+        **{
+            _NODE_STYLE[key]: value
+            for key, value in style.items()
+            if key in _NODE_STYLE
+        },
+    )
+    ax.tick_params(
+        axis="both",
+        which="both",
+        bottom=False,
+        left=False,
+        labelbottom=False,
+        labelleft=False,
     )
-    nx.draw_networkx_nodes(graph, pos=pos, ax=ax, node_color="tab:blue", **style)
     ax.set_aspect("equal")
+    return node_collection, edge_collection
+
+
+def search_overlay(
+    ax: plt.Axes, pos: PosDict, events: SearchEvents, style: dict, animated=False
+):
+    """Scatter collections for the searched and path nodes of a search, drawn over a
+    graph.
+
+    The collections are created once; `set_counts(num_searched, num_path)` shows the
+    first `num_searched` discovered nodes and the first `num_path` path nodes by
+    setting their offsets to a prefix of precomputed coordinates.
+
+    Returns
+    -------
+    set_counts: func(int, int)
+    artists: (searched PathCollection, path PathCollection)
+    """
+    searched_coords = np.array(
+        [pos[n] for n in events.discovered], dtype=float
+    ).reshape(-1, 2)
+    path_coords = np.array([pos[n] for n in events.path], dtype=float).reshape(-1, 2)
+    node_size = style.get("node_size", 300)
+    searched = ax.scatter(
+        *searched_coords[:0].T,
+        s=node_size,
+        c="tab:orange",
+        zorder=3,
+        animated=animated,
+    )
+    path = ax.scatter(
+        *path_coords[:0].T, s=node_size, c="tab:green", zorder=4, animated=animated
+    )
+
+    def set_counts(num_searched: int, num_path: int):
+        searched.set_offsets(searched_coords[:num_searched])
+        path.set_offsets(path_coords[:num_path])
+
+    return set_counts, (searched, path)
+
+
+def animation_steps(
+    events: SearchEvents, sample_steps: tuple[int, int]
+) -> list[tuple[int, int]]:
+    """(searched, path) node counts of each animation frame, with the first frame shown
+    twice and the last frame held for three more"""
+    steps = step_counts(events, sample_steps)
+    return steps[:1] + steps + steps[-1:] * 3
 
 
 def plot_pathfinding(
@@ -69,8 +333,12 @@ def plot_pathfinding(
     sample_steps: tuple[int, int] = (200, 10),
     title: str = "",
     style: Optional[dict] = None,
+    blit=True,
 ):
-    """Animates the pathfinding steps
+    """Animates the pathfinding steps.
+
+    The graph is drawn once, and each frame only updates the searched and path node
+    collections, so no artists accumulate over the animation.
 
     Parameters
     ----------
@@ -89,6 +357,8 @@ def plot_pathfinding(
         a frame to the animation.
     style: dict
         Style of graph
+    blit: bool
+        Only redraw the nodes on each frame when displaying the animation
 
     Returns:
     --------
@@ -99,41 +369,17 @@ def plot_pathfinding(
     if style is None:
         style = {}
 
-    steps = pathfind_steps(
-        search_generator=search_func(graph, start, end),
-        start=start,
-        end=end,
-        sample_steps=sample_steps,
-    )
-    steps.insert(0, steps[0])  # Artificially extend the length of the first frame
+    events = search_events(search_func(graph, start, end), start, end)
 
     fig, ax = plt.subplots(figsize=(6, 6))
+    plot_graph(graph, pos, ax, min_edge_length=min_edge_length, style=style)
+
+    set_counts, artists = search_overlay(ax, pos, events, style)
+    frames = animation_steps(events, sample_steps)
 
     def update(frame: int):
-        if frame >= len(steps):
-            return
-
-        searched_nodes, path_nodes = steps[frame]
-
-        # Draw the updated graph with new node colors
-        nx.draw_networkx_nodes(
-            graph,
-            pos=pos,
-            ax=ax,
-            nodelist=searched_nodes,
-            node_color="tab:orange",
-            # Pylance doesn't know that style==None has already been taken care of
-            **style,  # type: ignore
-        )
-        nx.draw_networkx_nodes(
-            graph,
-            pos=pos,
-            ax=ax,
-            nodelist=path_nodes,
-            node_color="tab:green",
-            # Pylance doesn't know that style==None has already been taken care of
-            **style,  # type: ignore
-        )
+        set_counts(*frames[frame])
+        return artists
 
     if title:
         # fig.suptitle(title)
@@ -145,10 +391,9 @@ def plot_pathfinding(
     return FuncAnimation(
         fig,
         update,
-        init_func=partial(
-            plot_graph, graph, pos, ax, min_edge_length=min_edge_length, style=style
-        ),
+        init_func=partial(update, 0),
         interval=100,
-        frames=len(steps) + 3,
+        frames=len(frames),
         repeat=True,
+        blit=blit,
     )
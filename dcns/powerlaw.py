@@ -1,11 +1,13 @@
 import itertools
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
 from numpy.typing import NDArray
 
+from dcns.powerlaw_fit import degree_ccdf, degree_pdf, fit_powerlaw
+
 
 def degree_sequence(G: nx.Graph):
     deg = G.degree()
@@ -13,48 +15,42 @@ def degree_sequence(G: nx.Graph):
 
 
 def degree_distribution(G: nx.Graph, normalize=True):
-    deg_sequence = degree_sequence(G)
-    max_degree = np.max(deg_sequence)
-    ddist = np.zeros((max_degree + 1,))
-    for d in deg_sequence:
-        ddist[d] += 1
-    if normalize:
-        ddist /= float(G.number_of_nodes())
-    return ddist
+    return degree_pdf(degree_sequence(G), normalize=normalize)
 
 
 def cumulative_degree_distribution(G: nx.Graph):
-    ddist = degree_distribution(G)
-    return np.array([ddist[k:].sum() for k in range(len(ddist))])
+    return degree_ccdf(degree_sequence(G))
 
 
 def calc_powerlaw_ax(
-    axes: tuple[plt.Axes, plt.Axes], G: nx.Graph, kmin: Optional[int] = None
+    axes: tuple[plt.Axes, plt.Axes],
+    G: nx.Graph,
+    kmin: Optional[Union[int, Literal["auto"]]] = None,
 ):
-    """Plot powerlaw PDF/CDF for a pair of axes."""
+    """Plot powerlaw PDF/CDF for a pair of axes.
+
+    If `kmin` is "auto", it is chosen by a Kolmogorov-Smirnov scan (see
+    `dcns.powerlaw_fit.fit_powerlaw`).
+    """
     deg_seq = np.array(degree_sequence(G))
     deg_dist = degree_distribution(G, normalize=False)
     cum_dist = cumulative_degree_distribution(G)
 
     if kmin is not None:
-        # Number of nodes above cutoff degree
-        N = np.count_nonzero(deg_seq >= (kmin or 0))
-        # Make sure we have some nodes so we don't divide by 0
-        assert N > 0
-
+        fit = fit_powerlaw(deg_seq, kmin=None if kmin == "auto" else kmin)
+        kmin = fit.kmin
         # Newman Eq (8.6): α = 1+N/Σ[ln({k_i}/{k_min}-0.5})]
-        alpha = 1 + N / sum(np.log(ki / (kmin - 0.5)) for ki in deg_seq if ki >= kmin)
         # Newman Eq (8.7): σ = (α-1)/√N
-        sigma = (alpha - 1) / np.sqrt(N)
+        alpha, sigma = fit.alpha, fit.sigma
     else:
         alpha = None
         sigma = None
 
     # PDF
-    axes[0].bar(*zip(*enumerate(deg_dist)), width=0.8, bottom=0, color="b")
+    axes[0].bar(np.arange(len(deg_dist)), deg_dist, width=0.8, bottom=0, color="b")
 
     # CDF
-    axes[1].loglog(*zip(*enumerate(cum_dist)))
+    axes[1].loglog(np.arange(len(cum_dist)), cum_dist)
     if kmin is not None:
         axes[1].axvline(kmin, color="orange", linestyle="dashed")
     axes[1].grid(True)
@@ -64,7 +60,7 @@ def calc_powerlaw_ax(
 
 
 def calc_powerlaw_multi(
-    graphs: dict[str, Union[nx.Graph, tuple[nx.Graph, int]]],
+    graphs: dict[str, Union[nx.Graph, tuple[nx.Graph, Union[int, Literal["auto"]]]]],
     *,
     title: str = "",
     sharey: bool = False,
@@ -74,8 +70,9 @@ def calc_powerlaw_multi(
 
     Parameters
     ----------
-    graphs: dict of nx.Graph or tuple[nx.Graph, int]
-        If given in tuple form, the integer is the corresponding kmin value
+    graphs: dict of nx.Graph or tuple[nx.Graph, int | "auto"]
+        If given in tuple form, the integer is the corresponding kmin value, or "auto"
+        to choose kmin automatically
     title: str
     sharey: bool
         Shares y values across rows of plot
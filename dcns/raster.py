@@ -0,0 +1,423 @@
+"""Rasterize large networks into images instead of drawing each node and edge.
+
+Nodes are binned as points and edges as one-pixel-wide lines into arrays at the
+target resolution, summing a weight (such as `num_trips`) per pixel. The arrays are
+then shaded with a colormap, so the cost of an image depends on the number of pixels
+and visible elements, never on matplotlib artists.
+
+Aggregate arrays have shape (height, width) with row 0 at the bottom of the bounding
+box (the smallest y), so they display with `imshow(..., origin="lower")`.
+"""
+
+from collections import OrderedDict
+from typing import Literal, NamedTuple, Optional, Union
+
+import matplotlib.pyplot as plt
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from dcns.compiled_graph import CompiledGraph, compile_graph
+from dcns.graph_utils import BBox, Graph
+
+Shading = Literal["linear", "log", "eq_hist"]
+
+
+class Aggregate(NamedTuple):
+    edges: NDArray[np.floating]
+    """Summed edge weight of the edges passing through each pixel"""
+    nodes: NDArray[np.floating]
+    """Number of nodes in each pixel"""
+    bbox: NDArray[np.floating]
+    """Extent [[xmin, xmax], [ymin, ymax]] covered by the arrays"""
+
+
+def _to_pixels(
+    xy: NDArray[np.floating], bbox: NDArray[np.floating], shape: tuple[int, int]
+) -> NDArray[np.floating]:
+    """Continuous pixel coordinates, where pixel (i, j) covers [j, j+1) x [i, i+1)"""
+    height, width = shape
+    scale = np.array([width, height]) / (bbox[:, 1] - bbox[:, 0])
+    return (xy - bbox[:, 0]) * scale
+
+
+def bin_points(
+    coords: ArrayLike,
+    bbox: BBox,
+    shape: tuple[int, int],
+    weights: Optional[ArrayLike] = None,
+    include_max: Union[bool, tuple[bool, bool], NDArray[np.bool_]] = True,
+) -> NDArray[np.floating]:
+    """Sum of the weights (or count) of the points in each pixel.
+
+    Pixels are half-open, so boxes that share an edge don't both count a point on it.
+
+    Parameters
+    ----------
+    coords: float array of shape (N, 2)
+    bbox: [[xmin, xmax], [ymin, ymax]]
+    shape: (height, width)
+    weights: float array of shape (N,) (optional)
+    include_max: bool or (bool, bool)
+        Count the points on the right (x) and top (y) edges of the box in the last
+        pixel. Only set it for the outer edges of a raster split into tiles.
+    """
+    height, width = shape
+    bbox = np.asarray(bbox, dtype=float)
+    px = _to_pixels(np.asarray(coords, dtype=float).reshape(-1, 2), bbox, shape)
+    size = np.array([width, height])
+    closed = np.broadcast_to(np.asarray(include_max, dtype=bool), (2,))
+    inside = np.all((px >= 0) & ((px < size) | (closed & (px == size))), axis=1)
+    cols = np.minimum(px[inside, 0].astype(np.intp), width - 1)
+    rows = np.minimum(px[inside, 1].astype(np.intp), height - 1)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[inside]
+    return (
+        np.bincount(rows * width + cols, weights, minlength=height * width)
+        .astype(float)
+        .reshape(shape)
+    )
+
+
+def _clip_segments(
+    start: NDArray[np.floating], end: NDArray[np.floating], size: NDArray[np.floating]
+) -> tuple[NDArray[np.bool_], NDArray[np.floating], NDArray[np.floating]]:
+    """Clip segments to the box [0, width] x [0, height] (Liang-Barsky)"""
+    delta = end - start
+    t0 = np.zeros(len(start))
+    t1 = np.ones(len(start))
+    outside = np.zeros(len(start), dtype=bool)
+    for axis in (0, 1):
+        for p, q in (
+            (-delta[:, axis], start[:, axis]),
+            (delta[:, axis], size[axis] - start[:, axis]),
+        ):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                r = q / p
+            outside |= (p == 0) & (q < 0)
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    keep = ~outside & (t0 <= t1)
+    t0, t1 = t0[keep, np.newaxis], t1[keep, np.newaxis]
+    start, delta = start[keep], delta[keep]
+    return keep, start + t0 * delta, start + t1 * delta
+
+
+def bin_segments(
+    start: ArrayLike,
+    end: ArrayLike,
+    bbox: BBox,
+    shape: tuple[int, int],
+    weights: Optional[ArrayLike] = None,
+    max_samples=1 << 20,
+) -> NDArray[np.floating]:
+    """Sum of the weights (or count) of the line segments through each pixel.
+
+    Segments are clipped to the box and sampled at least once per pixel along their
+    longer axis; each segment adds its weight once to every pixel it passes through.
+    Samples are generated `max_samples` at a time, so memory stays proportional to the
+    image and the number of segments, however long the segments are in pixels.
+
+    Parameters
+    ----------
+    start, end: float arrays of shape (E, 2)
+        Endpoints of each segment
+    bbox: [[xmin, xmax], [ymin, ymax]]
+    shape: (height, width)
+    weights: float array of shape (E,) (optional)
+    max_samples: int
+        Number of points sampled along the segments at a time
+    """
+    height, width = shape
+    bbox = np.asarray(bbox, dtype=float)
+    start = _to_pixels(np.asarray(start, dtype=float).reshape(-1, 2), bbox, shape)
+    end = _to_pixels(np.asarray(end, dtype=float).reshape(-1, 2), bbox, shape)
+    size = np.array([width, height], dtype=float)
+    # Most segments are usually inside the box, so only clip the others
+    inside = np.all((start >= 0) & (start <= size) & (end >= 0) & (end <= size), axis=1)
+    crossing = np.flatnonzero(~inside)
+    keep, clipped_start, clipped_end = _clip_segments(
+        start[crossing], end[crossing], size
+    )
+    order = np.concatenate((np.flatnonzero(inside), crossing[keep]))
+    start = np.concatenate((start[inside], clipped_start))
+    end = np.concatenate((end[inside], clipped_end))
+    weights = (
+        np.ones(len(order)) if weights is None else np.asarray(weights, float)[order]
+    )
+
+    delta = end - start
+    num_samples = np.ceil(np.abs(delta).max(axis=1, initial=0)).astype(np.intp) + 1
+    # Per-sample steps along each axis, in contiguous arrays for faster gathers
+    step = delta / np.maximum(num_samples - 1, 1)[:, np.newaxis]
+    x0, y0 = np.ascontiguousarray(start.T)
+    dx, dy = np.ascontiguousarray(step.T)
+
+    ends = np.cumsum(num_samples)
+    # Split the segments into batches of about `max_samples` samples
+    splits = np.searchsorted(
+        ends, np.arange(max_samples, ends[-1] if len(ends) else 0, max_samples)
+    )
+    image = np.zeros(height * width)
+    for batch in np.split(np.arange(len(start)), np.unique(splits)):
+        if len(batch) == 0:
+            continue
+        n = num_samples[batch]
+        segment = np.repeat(batch, n)
+        k = np.arange(len(segment)) - np.repeat(np.cumsum(n) - n, n)
+        cols = np.minimum((x0[segment] + k * dx[segment]).astype(np.intp), width - 1)
+        rows = np.minimum((y0[segment] + k * dy[segment]).astype(np.intp), height - 1)
+        flat = rows * width + cols
+        # Samples of a segment are in order along it, so repeated pixels are adjacent
+        first = np.ones(len(flat), dtype=bool)
+        first[1:] = (flat[1:] != flat[:-1]) | (k[1:] == 0)
+        image += np.bincount(
+            flat[first], weights[segment[first]], minlength=height * width
+        )
+    return image.reshape(shape)
+
+
+def shade(
+    agg: NDArray[np.floating], how: Shading = "eq_hist", cmap="viridis", min_value=0.0
+) -> NDArray[np.uint8]:
+    """Color an aggregate array, leaving empty pixels transparent.
+
+    Parameters
+    ----------
+    agg: float array of shape (height, width)
+    how: "linear" | "log" | "eq_hist"
+        Scaling of the values before the colormap. "eq_hist" spreads the distinct
+        values evenly over the colormap by rank, so both sparse and dense areas show
+        detail.
+    cmap: str | Colormap
+    min_value: float
+        Position in the colormap (0-1) of the smallest nonzero value
+
+    Returns
+    -------
+    RGBA uint8 array of shape (height, width, 4)
+    """
+    filled = agg > 0
+    values = agg[filled]
+    if how == "eq_hist":
+        distinct, inverse, counts = np.unique(
+            values, return_inverse=True, return_counts=True
+        )
+        cdf = np.cumsum(counts) / len(values)
+        scaled = cdf[inverse]
+        low = cdf[0] if len(cdf) else 0.0
+        scaled = (scaled - low) / (1 - low) if low < 1 else np.ones_like(scaled)
+    else:
+        if how == "log":
+            values = np.log1p(values)
+        elif how != "linear":
+            raise ValueError(f"Unknown shading: {how}")
+        low, high = (values.min(), values.max()) if len(values) else (0.0, 0.0)
+        scaled = (values - low) / (high - low) if high > low else np.ones_like(values)
+
+    image = np.zeros(agg.shape + (4,), dtype=np.uint8)
+    image[filled] = plt.get_cmap(cmap)(min_value + (1 - min_value) * scaled, bytes=True)
+    return image
+
+
+def composite(*images: NDArray[np.uint8]) -> NDArray[np.uint8]:
+    """Stack RGBA images with each one drawn over the previous ones"""
+    out = images[0].copy()
+    for image in images[1:]:
+        # Only blend the pixels the image covers
+        covered = image[..., 3] > 0
+        top = image[covered] / 255
+        bottom = out[covered] / 255
+        alpha = top[:, 3:]
+        blended_alpha = alpha + bottom[:, 3:] * (1 - alpha)
+        blended = top[:, :3] * alpha + bottom[:, :3] * bottom[:, 3:] * (1 - alpha)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            blended = np.where(blended_alpha > 0, blended / blended_alpha, 0)
+        out[covered] = np.rint(np.hstack((blended, blended_alpha)) * 255)
+    return out
+
+
+class GraphRaster:
+    """Rasterizes a graph at any zoom, caching square tiles per zoom level.
+
+    The tiles split the square around the graph's positions into 2^zoom x 2^zoom
+    tiles of `tile_size` pixels, numbered from the bottom left. At most `max_tiles`
+    tiles are kept, least recently used first out, so memory is bounded by
+    `max_tiles * tile_size^2` however large the graph.
+
+    Attributes
+    ----------
+    graph: CompiledGraph
+        With `coords`, and edge weights summed into the edge aggregates
+    extent: float array of shape (2, 2)
+        Bounding box [[xmin, xmax], [ymin, ymax]] of zoom level 0
+    tile_size: int
+    """
+
+    def __init__(self, graph: CompiledGraph, tile_size=256, max_tiles=128):
+        if graph.coords is None:
+            raise ValueError("Graph has no node positions")
+        self.graph = graph
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._start = graph.coords[graph.src]
+        self._end = graph.coords[graph.dst]
+        self._edge_low = np.minimum(self._start, self._end)
+        self._edge_high = np.maximum(self._start, self._end)
+        self._tiles: OrderedDict[tuple[int, int, int], Aggregate] = OrderedDict()
+
+        low = graph.coords.min(axis=0, initial=np.inf)
+        high = graph.coords.max(axis=0, initial=-np.inf)
+        if graph.num_nodes == 0:
+            low, high = np.zeros(2), np.ones(2)
+        center = (low + high) / 2
+        # Pad a little so nodes on the boundary don't fall between tiles
+        half = max((high - low).max(), 1e-9) * 0.505
+        self.extent = np.stack((center - half, center + half), axis=1)
+
+    @classmethod
+    def from_graph(
+        cls, G: Graph, weight: Optional[str] = "num_trips", pos="pos", **kwargs
+    ):
+        """Rasterize a networkx graph, weighting edges by an attribute (or counting
+        them if `weight` is None)"""
+        return cls(compile_graph(G, weight=weight, default=1.0, pos=pos), **kwargs)
+
+    def aggregate(self, bbox: BBox, shape: tuple[int, int]) -> Aggregate:
+        """Bin the nodes and edges inside a bounding box, without caching.
+
+        Parameters
+        ----------
+        bbox: [[xmin, xmax], [ymin, ymax]]
+        shape: (height, width)
+        """
+        bbox = np.asarray(bbox, dtype=float)
+        # Only clip the edges whose bounding boxes overlap the view
+        near = np.all(
+            (self._edge_high >= bbox[:, 0]) & (self._edge_low <= bbox[:, 1]), axis=1
+        )
+        edges = bin_segments(
+            self._start[near],
+            self._end[near],
+            bbox,
+            shape,
+            self.graph.weight[near],
+        )
+        # Only the outer edges of the extent are closed, so tiles that share an edge
+        # don't both count a node on it
+        span = self.extent[:, 1] - self.extent[:, 0]
+        outer = bbox[:, 1] >= self.extent[:, 1] - 1e-9 * span
+        nodes = bin_points(self.graph.coords, bbox, shape, include_max=outer)
+        return Aggregate(edges, nodes, bbox)
+
+    def tile_bbox(self, zoom: int, x: int, y: int) -> NDArray[np.floating]:
+        size = (self.extent[:, 1] - self.extent[:, 0]) / 2**zoom
+        low = self.extent[:, 0] + size * [x, y]
+        return np.stack((low, low + size), axis=1)
+
+    def tile(self, zoom: int, x: int, y: int) -> Aggregate:
+        """Aggregates of one tile (float32), computed once while it stays cached"""
+        key = (zoom, x, y)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+        edges, nodes, bbox = self.aggregate(
+            self.tile_bbox(zoom, x, y), (self.tile_size, self.tile_size)
+        )
+        tile = Aggregate(edges.astype(np.float32), nodes.astype(np.float32), bbox)
+        self._cache(key, tile)
+        return tile
+
+    def _cache(self, key: tuple[int, int, int], tile: Aggregate):
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+
+    def view(self, bbox: BBox, zoom: int) -> Aggregate:
+        """Aggregates of a bounding box at a zoom level, assembled from cached tiles.
+
+        The result covers the whole tiles overlapping `bbox`, so its `bbox` is usually
+        a little larger than the one requested.
+        """
+        bbox = np.asarray(bbox, dtype=float)
+        n = 2**zoom
+        size = (self.extent[:, 1] - self.extent[:, 0]) / n
+        first = np.clip(np.floor((bbox[:, 0] - self.extent[:, 0]) / size), 0, n - 1)
+        last = np.clip(np.ceil((bbox[:, 1] - self.extent[:, 0]) / size), 1, n)
+        (x0, y0), (x1, y1) = first.astype(int), last.astype(int)
+
+        t = self.tile_size
+        low = self.extent[:, 0] + size * [x0, y0]
+        high = self.extent[:, 0] + size * [x1, y1]
+        bbox = np.stack((low, high), axis=1)
+        keys = [(zoom, x, y) for y in range(y0, y1) for x in range(x0, x1)]
+        if all(key in self._tiles for key in keys):
+            edges = np.zeros(((y1 - y0) * t, (x1 - x0) * t), dtype=np.float32)
+            nodes = np.zeros_like(edges)
+            for key in keys:
+                _, x, y = key
+                rows = slice((y - y0) * t, (y - y0 + 1) * t)
+                cols = slice((x - x0) * t, (x - x0 + 1) * t)
+                edges[rows, cols] = self.tile(*key).edges
+                nodes[rows, cols] = self.tile(*key).nodes
+            return Aggregate(edges, nodes, bbox)
+
+        # Bin the whole block in one pass rather than one pass per missing tile
+        edges, nodes, _ = self.aggregate(bbox, ((y1 - y0) * t, (x1 - x0) * t))
+        edges, nodes = edges.astype(np.float32), nodes.astype(np.float32)
+        for key in keys:
+            _, x, y = key
+            rows = slice((y - y0) * t, (y - y0 + 1) * t)
+            cols = slice((x - x0) * t, (x - x0 + 1) * t)
+            self._cache(
+                key,
+                Aggregate(
+                    edges[rows, cols].copy(),
+                    nodes[rows, cols].copy(),
+                    self.tile_bbox(*key),
+                ),
+            )
+        return Aggregate(edges, nodes, bbox)
+
+    def clear_cache(self):
+        self._tiles.clear()
+
+
+def shade_aggregate(
+    agg: Aggregate,
+    how: Shading = "eq_hist",
+    edge_cmap="Greys",
+    node_cmap="Blues",
+    min_value=0.3,
+    show_nodes=True,
+) -> NDArray[np.uint8]:
+    """Shade edges and nodes separately and draw the nodes over the edges"""
+    image = shade(agg.edges, how, edge_cmap, min_value)
+    if show_nodes:
+        image = composite(image, shade(agg.nodes, how, node_cmap, min_value))
+    return image
+
+
+def plot_raster(
+    ax: plt.Axes,
+    agg: Aggregate,
+    how: Shading = "eq_hist",
+    edge_cmap="Greys",
+    node_cmap="Blues",
+    min_value=0.3,
+    show_nodes=True,
+):
+    """Shade an aggregate and show it as one image in its bounding box.
+
+    Returns
+    -------
+    AxesImage
+    """
+    image = ax.imshow(
+        shade_aggregate(agg, how, edge_cmap, node_cmap, min_value, show_nodes),
+        origin="lower",
+        extent=agg.bbox.ravel().tolist(),
+        interpolation="nearest",
+    )
+    ax.set_aspect("equal")
+    return image
@@ -0,0 +1,295 @@
+"""Render batches of pathfinding GIFs on a process pool.
+
+Each worker loads the graphs once and keeps one figure per graph with the graph already
+drawn. A job only draws its title, captures that as the background, and then draws the
+searched and path nodes over it for each frame. Outputs whose inputs haven't changed
+since the last run are skipped, using a fingerprint file written next to each GIF.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, Optional, Union
+
+import networkx as nx
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+from tqdm import tqdm
+
+from dcns.graph_utils import Graph, Node, node_attr_list_to_ndarray
+from dcns.pathfinding import astar_dist_search, astar_search, bfs_search, search_events
+from dcns.plot_graphs import animation_steps, plot_graph, search_overlay
+
+ALGORITHMS: dict[str, Callable] = {
+    "bfs": bfs_search,
+    "dijkstra": astar_search,
+    "astar": astar_dist_search,
+}
+"""Search generator functions by name. Functions must be picklable (module-level)."""
+
+
+class RenderJob(NamedTuple):
+    graph: str
+    """Name of the graph in the `graphs` passed to `render_gifs`"""
+    algorithm: str
+    """Name of the search function in `algorithms`"""
+    start: Node
+    end: Node
+    title: str
+    output: str
+    """Path of the GIF to write"""
+
+
+class RenderResult(NamedTuple):
+    job: RenderJob
+    skipped: bool
+    """True if the output was up to date"""
+    seconds: float
+    num_frames: int
+
+
+class RenderSettings(NamedTuple):
+    min_edge_length: float = 0.007
+    sample_steps: tuple[int, int] = (200, 10)
+    style: Optional[dict] = None
+    fps: int = 10
+    figsize: tuple[float, float] = (6, 6)
+
+
+def load_manifest(path: Union[str, Path]) -> list[RenderJob]:
+    """Read render jobs from a JSON list of objects with the `RenderJob` fields"""
+    with open(path) as f:
+        return [RenderJob(**job) for job in json.load(f)]
+
+
+def load_graph(graph: Union[str, Path, Graph]) -> Graph:
+    """Read a GML file (with `pos` lists converted to arrays), or pass a graph through"""
+    if isinstance(graph, (str, Path)):
+        graph = nx.read_gml(graph)
+        node_attr_list_to_ndarray(graph, "pos")
+    return graph
+
+
+def graph_fingerprint(graph: Union[str, Path, Graph]) -> str:
+    """Hash of a GML file's contents, or of a graph's nodes, positions and edges"""
+    h = hashlib.sha256()
+    if isinstance(graph, (str, Path)):
+        h.update(Path(graph).read_bytes())
+        return h.hexdigest()
+    for node, pos in graph.nodes(data="pos"):
+        h.update(repr((node, np.asarray(pos).tolist())).encode())
+    for edge in graph.edges(data=True):
+        h.update(repr(edge).encode())
+    return h.hexdigest()
+
+
+def job_fingerprint(
+    job: RenderJob, graph_hash: str, algorithm: Callable, settings: RenderSettings
+) -> str:
+    """Hash of everything a job's output depends on"""
+    key = (
+        job,
+        graph_hash,
+        algorithm.__module__,
+        algorithm.__qualname__,
+        settings._replace(style=sorted((settings.style or {}).items())),
+    )
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def _fingerprint_path(output: Union[str, Path]) -> Path:
+    output = Path(output)
+    return output.with_name(output.name + ".fingerprint")
+
+
+def is_up_to_date(output: Union[str, Path], fingerprint: str) -> bool:
+    sidecar = _fingerprint_path(output)
+    return (
+        Path(output).exists()
+        and sidecar.exists()
+        and sidecar.read_text().strip() == fingerprint
+    )
+
+
+# Per-worker state, set up once by `_init_worker`
+_graphs: dict[str, Graph] = {}
+_algorithms: dict[str, Callable] = {}
+_settings = RenderSettings()
+_base_layers: dict[str, tuple[Figure, FigureCanvasAgg]] = {}
+
+
+def _init_worker(
+    graphs: dict[str, Union[str, Path, Graph]],
+    algorithms: dict[str, Callable],
+    settings: RenderSettings,
+):
+    global _settings
+    _graphs.clear()
+    _graphs.update({name: load_graph(graph) for name, graph in graphs.items()})
+    _algorithms.clear()
+    _algorithms.update(algorithms)
+    _settings = settings
+    _base_layers.clear()
+
+
+def _base_layer(name: str) -> tuple[Figure, FigureCanvasAgg]:
+    """Figure with a graph drawn on it, created once per graph per worker"""
+    if name not in _base_layers:
+        graph = _graphs[name]
+        fig = Figure(figsize=_settings.figsize)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        plot_graph(
+            graph,
+            nx.get_node_attributes(graph, "pos"),
+            ax,
+            min_edge_length=_settings.min_edge_length,
+            style=_settings.style or {},
+        )
+        ax.set_title(" ")
+        fig.tight_layout()
+        fig.subplots_adjust(left=0, right=1, wspace=0)
+        ax.set_autoscale_on(False)
+        _base_layers[name] = fig, canvas
+    return _base_layers[name]
+
+
+def _render(job: RenderJob, fingerprint: str) -> RenderResult:
+    """Render one job in a worker, and write its fingerprint after the GIF"""
+    started = time.perf_counter()
+    graph = _graphs[job.graph]
+    events = search_events(
+        _algorithms[job.algorithm](graph, job.start, job.end), job.start, job.end
+    )
+
+    fig, canvas = _base_layer(job.graph)
+    ax = fig.axes[0]
+    ax.set_title(job.title)
+    set_counts, artists = search_overlay(
+        ax,
+        nx.get_node_attributes(graph, "pos"),
+        events,
+        _settings.style or {},
+        animated=True,
+    )
+    try:
+        # Draw the graph and title once, then only the overlay on each frame
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+        frames = []
+        for counts in animation_steps(events, _settings.sample_steps):
+            canvas.restore_region(background)
+            set_counts(*counts)
+            for artist in artists:
+                ax.draw_artist(artist)
+            frames.append(Image.fromarray(np.asarray(canvas.buffer_rgba())).copy())
+    finally:
+        for artist in artists:
+            artist.remove()
+
+    output = Path(job.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    # Same encoding as matplotlib's pillow writer
+    frames[0].save(
+        output,
+        save_all=True,
+        append_images=frames[1:],
+        duration=int(1000 / _settings.fps),
+        loop=0,
+    )
+    _fingerprint_path(output).write_text(fingerprint)
+    return RenderResult(job, False, time.perf_counter() - started, len(frames))
+
+
+def render_gifs(
+    jobs: Iterable[RenderJob],
+    graphs: dict[str, Union[str, Path, Graph]],
+    algorithms: Optional[dict[str, Callable]] = None,
+    settings: Optional[RenderSettings] = None,
+    workers: Optional[int] = None,
+    force=False,
+    show_progress=True,
+) -> list[RenderResult]:
+    """Render pathfinding GIFs for a manifest of jobs on a process pool.
+
+    Parameters
+    ----------
+    jobs: iterable of RenderJob
+        Such as from `load_manifest`
+    graphs: dict of name -> GML path or graph
+        Graphs are sent to (or loaded by) each worker once
+    algorithms: dict of name -> search generator function (optional)
+        Defaults to `ALGORITHMS`
+    settings: RenderSettings (optional)
+        Frame sampling, style and GIF settings shared by every job
+    workers: int (optional)
+        Number of worker processes. Defaults to the number of CPUs.
+    force: bool
+        Render every job even if its output is up to date
+    show_progress: bool
+
+    Returns
+    -------
+    list of RenderResult in the order of `jobs`, with the time each job took
+    """
+    jobs = list(jobs)
+    algorithms = ALGORITHMS if algorithms is None else algorithms
+    settings = RenderSettings() if settings is None else settings
+
+    graph_hashes = {
+        name: graph_fingerprint(graphs[name]) for name in {j.graph for j in jobs}
+    }
+    fingerprints = [
+        job_fingerprint(
+            job, graph_hashes[job.graph], algorithms[job.algorithm], settings
+        )
+        for job in jobs
+    ]
+
+    results: list[Optional[RenderResult]] = [None] * len(jobs)
+    pending = []
+    for i, (job, fingerprint) in enumerate(zip(jobs, fingerprints)):
+        if not force and is_up_to_date(job.output, fingerprint):
+            results[i] = RenderResult(job, True, 0.0, 0)
+        else:
+            pending.append(i)
+
+    if pending:
+        # Only send the graphs that pending jobs use
+        used = {jobs[i].graph for i in pending}
+        initargs = ({name: graphs[name] for name in used}, algorithms, settings)
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=initargs,
+        ) as executor:
+            futures = {
+                executor.submit(_render, jobs[i], fingerprints[i]): i for i in pending
+            }
+            for future in tqdm(
+                as_completed(futures), total=len(futures), disable=not show_progress
+            ):
+                results[futures[future]] = future.result()
+
+    return results  # type: ignore
+
+
+def format_report(results: Iterable[RenderResult]) -> str:
+    """One line per job with its render time, and a total"""
+    results = list(results)
+    lines = [
+        f"{'skipped' if r.skipped else f'{r.seconds:7.2f}s'}  "
+        f"{r.num_frames:4d} frames  {r.job.output}"
+        for r in results
+    ]
+    rendered = [r for r in results if not r.skipped]
+    lines.append(
+        f"{len(rendered)} rendered, {len(results) - len(rendered)} skipped, "
+        f"{sum(r.seconds for r in rendered):.2f}s of rendering"
+    )
+    return "\n".join(lines)
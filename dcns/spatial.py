@@ -0,0 +1,151 @@
+"""Spatial index over stop positions and routing between arbitrary coordinates."""
+
+from typing import Optional, Union
+
+import networkx as nx
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from scipy.spatial import cKDTree
+
+from dcns.graph_utils import AttributeStore, Graph, PosDict, pos_to_array
+from dcns.pathfinding import NoPathBetweenNodes, multi_dijkstra
+
+EARTH_RADIUS = 6_371_008.8
+"""Mean radius of the earth in meters"""
+
+WALKING_SPEED = 1.4
+"""Average walking speed in meters per second"""
+
+
+def project_lonlat(coords: ArrayLike, ref_lat: float) -> NDArray[np.floating]:
+    """Project (lon, lat) coordinates in degrees to local (x, y) coordinates in meters.
+
+    Uses an equirectangular projection around the reference latitude, which is accurate
+    to well under a percent over a metro area.
+    """
+    coords = np.radians(np.asarray(coords, dtype=float))
+    xy = EARTH_RADIUS * coords
+    xy[..., 0] *= np.cos(np.radians(ref_lat))
+    return xy
+
+
+class StopIndex:
+    """KD-tree over stop positions for nearest-stop and radius queries.
+
+    Positions are (lon, lat) in degrees, in the networkx `pos` format. Queries take
+    (lon, lat) points and distances are in meters.
+
+    Attributes
+    ----------
+    nodes: object array of shape (N,)
+        Stops in index order
+    coords: float array of shape (N, 2)
+        Projected stop coordinates in meters
+    ref_lat: float
+        Reference latitude of the projection
+    """
+
+    def __init__(self, pos: Union[PosDict, AttributeStore]):
+        nodes, lonlat = pos_to_array(pos)
+        self.nodes = np.empty(len(nodes), dtype=object)
+        self.nodes[:] = nodes
+        self.ref_lat = float(lonlat[:, 1].mean()) if len(lonlat) else 0.0
+        self.coords = project_lonlat(lonlat, self.ref_lat)
+        self.tree = cKDTree(self.coords)
+
+    @classmethod
+    def from_graph(cls, G: Graph, attr="pos"):
+        return cls(nx.get_node_attributes(G, attr))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def project(self, points: ArrayLike) -> NDArray[np.floating]:
+        """Project (lon, lat) points into the index's coordinates"""
+        return project_lonlat(points, self.ref_lat)
+
+    def query(self, points: ArrayLike, k=1, max_distance=np.inf):
+        """Find the k nearest stops to each (lon, lat) point.
+
+        Returns
+        -------
+        distances: float array of shape (M, k), inf where fewer than k stops were found
+        indices: int array of shape (M, k), `len(self)` where fewer than k stops were found
+        """
+        xy = self.project(np.atleast_2d(points))
+        distances, indices = self.tree.query(xy, k=k, distance_upper_bound=max_distance)
+        return distances.reshape(len(xy), k), indices.reshape(len(xy), k)
+
+    def query_radius(self, points: ArrayLike, radius: float) -> list[list[int]]:
+        """Find the indices of all stops within `radius` meters of each (lon, lat) point"""
+        return self.tree.query_ball_point(self.project(np.atleast_2d(points)), radius)
+
+    def nearest_stops(self, point: ArrayLike, k=1, max_distance=np.inf):
+        """Dictionary of the k nearest stops to a (lon, lat) point and their distance"""
+        distances, indices = self.query(point, k=k, max_distance=max_distance)
+        found = np.isfinite(distances[0])
+        return dict(zip(self.nodes[indices[0, found]], distances[0, found].tolist()))
+
+    def stops_within(self, point: ArrayLike, radius: float):
+        """Dictionary of the stops within `radius` meters of a (lon, lat) point and their
+        distance"""
+        indices = self.query_radius(point, radius)[0]
+        distances = np.linalg.norm(self.coords[indices] - self.project(point), axis=-1)
+        return dict(zip(self.nodes[indices], distances.tolist()))
+
+
+def route_coords(
+    graph: Graph,
+    stop_index: StopIndex,
+    origin: ArrayLike,
+    destination: ArrayLike,
+    k=5,
+    max_walk: Optional[float] = 500.0,
+    walking_speed=WALKING_SPEED,
+    weight="weight",
+):
+    """Get the shortest trip between two (lon, lat) coordinates.
+
+    The origin and destination are connected to their k nearest stops by walking legs.
+    Walking time is added to the trip, so `weight` should be a travel time in seconds.
+
+    Parameters
+    ----------
+    graph: nx.Graph | nx.DiGraph
+    stop_index: StopIndex
+        Index over the stops in `graph`. Stops that aren't in `graph` (e.g., if the
+        index was built for a larger graph) are skipped.
+    origin: (lon, lat)
+    destination: (lon, lat)
+    k: int
+        Number of nearby stops to consider at each end
+    max_walk: float (optional)
+        Maximum walking distance in meters
+    walking_speed: float
+        Walking speed in meters per second
+    weight: str
+        Edge attribute for the travel time in seconds
+
+    Returns
+    -------
+    final_path: list of Nodes
+    distance: trip length including walking time (seconds)
+    num_nodes_searched: number of nodes searched before finding the path
+    """
+    distances, indices = stop_index.query(
+        [origin, destination],
+        k=k,
+        max_distance=np.inf if max_walk is None else max_walk,
+    )
+    starts, ends = (
+        {
+            stop_index.nodes[i]: d / walking_speed
+            for d, i in zip(row_dist.tolist(), row_idx.tolist())
+            if np.isfinite(d) and stop_index.nodes[i] in graph
+        }
+        for row_dist, row_idx in zip(distances, indices)
+    )
+    if not starts or not ends:
+        raise NoPathBetweenNodes(tuple(origin), tuple(destination))  # type: ignore
+
+    return multi_dijkstra(graph, starts, ends, weight=weight)
@@ -0,0 +1,269 @@
+"""All-pairs travel times between stops, stored in a memory-mapped file.
+
+The file starts with a short header listing the stops, followed by the travel time
+matrix and (optionally) a next-hop matrix for reconstructing paths. Both matrices are
+stored by destination: row j holds the travel time from every stop to stop j, and the
+next stop on the way to j. Opening the file only maps it, so any number of processes
+can share one copy in the page cache.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Literal, Optional, Union
+
+import numpy as np
+import scipy.sparse as sp
+from numpy.typing import NDArray
+from scipy.sparse.csgraph import dijkstra
+
+from dcns.compiled_graph import CompiledGraph
+from dcns.graph_utils import Node
+from dcns.pathfinding import NoPathBetweenNodes
+
+MAGIC = b"DCNSTTM1"
+"""First bytes of a travel time matrix file"""
+
+ALIGNMENT = 4096
+"""Matrices start at a multiple of this many bytes"""
+
+UNREACHABLE_MINUTES = np.iinfo(np.uint16).max
+"""Travel time stored for unreachable pairs in uint16 (minutes) matrices"""
+
+TimeFormat = Literal["float32", "uint16"]
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(header: dict, header_end: int) -> dict:
+    """Header with the byte offsets of the matrices, which follow the header"""
+    N = header["num_nodes"]
+    times_offset = _align(header_end)
+    times_end = times_offset + N * N * np.dtype(header["time_dtype"]).itemsize
+    return {
+        **header,
+        "times_offset": times_offset,
+        "next_hop_offset": _align(times_end),
+    }
+
+
+def _node_to_json(obj):
+    """Node ids that json can't encode itself, such as numpy integers"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Node {obj!r} of type {type(obj).__name__} can't be stored")
+
+
+def _node_from_json(node):
+    """Nodes are hashable, so a JSON list can only be a tuple node"""
+    return tuple(map(_node_from_json, node)) if isinstance(node, list) else node
+
+
+def _read_header(path: Path) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a travel time matrix file")
+        length = int.from_bytes(f.read(8), "little")
+        return _layout(json.loads(f.read(length)), len(MAGIC) + 8 + length)
+
+
+def _write_times(
+    path: Path,
+    header: dict,
+    data: NDArray[np.floating],
+    indices: NDArray[np.int32],
+    indptr: NDArray[np.int32],
+    destinations: NDArray[np.intp],
+):
+    """Fill the rows of a batch of destinations, searching the reversed graph"""
+    N = header["num_nodes"]
+    reverse = sp.csr_array((data, indices, indptr), shape=(N, N))
+    with_next_hop = header["next_hop_dtype"] is not None
+    result = dijkstra(reverse, indices=destinations, return_predecessors=with_next_hop)
+    dist, predecessors = result if with_next_hop else (result, None)
+
+    times = np.memmap(path, header["time_dtype"], "r+", header["times_offset"], (N, N))
+    if header["units"] == "minutes":
+        minutes = np.rint(dist / 60)
+        minutes[~(minutes < UNREACHABLE_MINUTES)] = UNREACHABLE_MINUTES
+        times[destinations] = minutes
+    else:
+        times[destinations] = dist
+    times.flush()
+
+    if predecessors is not None:
+        # A node's predecessor on the reversed search from j is its next hop toward j
+        next_hop = np.memmap(
+            path, header["next_hop_dtype"], "r+", header["next_hop_offset"], (N, N)
+        )
+        next_hop[destinations] = np.where(predecessors < 0, -1, predecessors)
+        next_hop.flush()
+
+
+def build_travel_time_matrix(
+    graph: CompiledGraph,
+    path: Union[str, Path],
+    time_format: TimeFormat = "float32",
+    next_hop=True,
+    workers: Optional[int] = None,
+    batch_size=64,
+) -> "TravelTimeMatrix":
+    """Compute the travel time between every pair of stops and write it to a file.
+
+    One-to-all searches run on the reversed graph, a batch of destinations at a time,
+    on a process pool. Each worker writes its rows straight into the mapped file.
+
+    Parameters
+    ----------
+    graph: CompiledGraph
+        Graph whose edge weights are travel times in seconds. Node ids must be strings,
+        numbers (including numpy scalars), or tuples of them.
+    path: str | Path
+        Output file
+    time_format: "float32" | "uint16"
+        Store seconds as float32 (4 bytes per pair), or whole minutes as uint16 (2
+        bytes per pair)
+    next_hop: bool
+        Also store the next stop on each shortest path, so paths can be reconstructed
+    workers: int (optional)
+        Number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+    batch_size: int
+        Destinations per task
+    """
+    path = Path(path)
+    N = graph.num_nodes
+    time_dtype = np.dtype(np.float32 if time_format == "float32" else np.uint16)
+    next_hop_dtype = np.dtype(np.int16 if N <= np.iinfo(np.int16).max else np.int32)
+
+    header = {
+        "nodes": graph.nodes,
+        "num_nodes": N,
+        "units": "seconds" if time_format == "float32" else "minutes",
+        "time_dtype": time_dtype.str,
+        "next_hop_dtype": next_hop_dtype.str if next_hop else None,
+    }
+    encoded = json.dumps(header, default=_node_to_json).encode()
+    header = _layout(header, len(MAGIC) + 8 + len(encoded))
+    end = header["times_offset"] + N * N * time_dtype.itemsize
+    if next_hop:
+        end = header["next_hop_offset"] + N * N * next_hop_dtype.itemsize
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, "little"))
+        f.write(encoded)
+        f.truncate(end)
+
+    reverse = sp.csr_array(graph.csr().T) if graph.directed else graph.csr()
+    args = (path, header, reverse.data, reverse.indices, reverse.indptr)
+    batches = [
+        np.arange(start, min(start + batch_size, N))
+        for start in range(0, N, batch_size)
+    ]
+    if workers == 1:
+        for batch in batches:
+            _write_times(*args, batch)
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for future in [executor.submit(_write_times, *args, b) for b in batches]:
+                future.result()
+
+    return TravelTimeMatrix(path)
+
+
+class TravelTimeMatrix:
+    """Read-only memory-mapped all-pairs travel times, written by
+    `build_travel_time_matrix`.
+
+    Travel times are returned in seconds (whole minutes times 60 for uint16 files) and
+    are inf for unreachable pairs.
+
+    Attributes
+    ----------
+    filename: Path
+    nodes: list of Nodes
+        Stops in index order
+    node_index: dict of Node -> int
+    units: "seconds" | "minutes"
+        Units of the stored times
+    times: memmap of shape (N, N)
+        `times[j, i]` is the stored travel time from stop i to stop j
+    next_hop: memmap of shape (N, N) (optional)
+        `next_hop[j, i]` is the index of the stop after i on the way to j, -1 if
+        there is none
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.filename = Path(path)
+        header = _read_header(self.filename)
+        self.nodes: list[Node] = [_node_from_json(n) for n in header["nodes"]]
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.units = header["units"]
+        N = header["num_nodes"]
+        self.times = np.memmap(
+            self.filename, header["time_dtype"], "r", header["times_offset"], (N, N)
+        )
+        self.next_hop = (
+            None
+            if header["next_hop_dtype"] is None
+            else np.memmap(
+                self.filename,
+                header["next_hop_dtype"],
+                "r",
+                header["next_hop_offset"],
+                (N, N),
+            )
+        )
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _seconds(self, stored: NDArray) -> NDArray[np.floating]:
+        if self.units == "minutes":
+            seconds = stored.astype(float) * 60
+            seconds[stored == UNREACHABLE_MINUTES] = np.inf
+            return seconds
+        return stored.astype(float)
+
+    def indices(self, nodes: Iterable[Node]) -> NDArray[np.intp]:
+        return np.fromiter((self.node_index[n] for n in nodes), dtype=np.intp)
+
+    def travel_time(self, origin: Node, destination: Node) -> float:
+        """Travel time in seconds from one stop to another"""
+        i, j = self.node_index[origin], self.node_index[destination]
+        return float(self._seconds(self.times[j, i : i + 1])[0])
+
+    def travel_times(
+        self, origins: Iterable[Node], destinations: Iterable[Node]
+    ) -> NDArray[np.floating]:
+        """Travel times in seconds between pairs of stops, with shape (M,)"""
+        i, j = self.indices(origins), self.indices(destinations)
+        return self._seconds(self.times[j, i])
+
+    def times_to(self, destination: Node) -> NDArray[np.floating]:
+        """Travel time in seconds from every stop to a destination, in index order"""
+        return self._seconds(self.times[self.node_index[destination]])
+
+    def times_from(self, origin: Node) -> NDArray[np.floating]:
+        """Travel time in seconds from an origin to every stop, in index order.
+
+        Reads one column, so this is slower than `times_to`.
+        """
+        return self._seconds(self.times[:, self.node_index[origin]])
+
+    def path(self, origin: Node, destination: Node) -> list[Node]:
+        """Shortest path from one stop to another, following the next-hop matrix"""
+        if self.next_hop is None:
+            raise ValueError("Matrix was built without a next-hop matrix")
+        i, j = self.node_index[origin], self.node_index[destination]
+        row = self.next_hop[j]
+        path = [i]
+        while i != j:
+            i = int(row[i])
+            if i < 0:
+                raise NoPathBetweenNodes(origin, destination)  # type: ignore
+            path.append(i)
+        return [self.nodes[k] for k in path]